@@ -0,0 +1,171 @@
+import datetime
+import os
+import sqlite3
+import unicodedata
+
+import db
+
+SQLITE_SCHEMA = os.path.join(os.path.dirname(__file__), "..", "init_sqlite.sql")
+
+
+class MySQLBackend:
+    """The database the loader writes to and the statements whose syntax
+    differs between databases; everything else the loader issues is SQL that
+    every backend understands, with %s placeholders."""
+
+    name = "mysql"
+    # comparison of key columns where NULL matches NULL
+    equals = "<=>"
+
+    def __init__(self, **connect_args):
+        self.connect_args = connect_args
+
+    def connect(self, session=None):
+        return db.connect(session, **self.connect_args)
+
+    @staticmethod
+    def fold(value):
+        # what a string compares as under utf8mb4_0900_ai_ci, the default
+        # collation of the UNIQUE keys: without case and accents
+        if value.isascii():
+            return value.casefold()
+        decomposed = unicodedata.normalize("NFKD", value)
+        return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+    def insert(self, table, columns, update=None, select=None):
+        # one row of placeholders or the rows of `select`; duplicates are
+        # ignored unless `update` names the columns to overwrite
+        names = ", ".join(f"`{c}`" for c in columns)
+        rows = select or f"VALUES ({', '.join(['%s'] * len(columns))})"
+        if not update:
+            return f"INSERT IGNORE INTO `{table}` ({names}) {rows}"
+
+        assignments = ", ".join(f"`{c}` = VALUES(`{c}`)" for c in update)
+        return (
+            f"INSERT INTO `{table}` ({names}) {rows} "
+            f"ON DUPLICATE KEY UPDATE {assignments}"
+        )
+
+    def update_ratings(self):
+        # {} takes the WHERE clause over review
+        return """
+            UPDATE `product` p
+            JOIN (
+                SELECT `product_id`, AVG(`rating`) AS `rating` FROM `review`
+                {} GROUP BY `product_id`
+            ) r ON r.`product_id` = p.`id`
+            SET p.`rating` = r.`rating`
+        """
+
+
+MYSQL = MySQLBackend()
+
+
+class SQLiteCursor:
+    # the statements are written with the %s placeholders of mysql.connector
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def execute(self, sql, params=()):
+        return self.cursor.execute(sql.replace("%s", "?"), params or ())
+
+    def executemany(self, sql, params):
+        return self.cursor.executemany(sql.replace("%s", "?"), params)
+
+
+class SQLiteConnection:
+    """A sqlite3 connection with the part of the mysql.connector interface
+    the loader uses. User variables of the session are kept here and read by
+    the triggers of init_sqlite.sql through the function variable(name)."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.variables = {}
+        self.conn.create_function("variable", 1, self.variables.get)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+
+    def cursor(self, **options):
+        # buffered and prepared cursors have no sqlite3 counterpart; sqlite3
+        # caches compiled statements per connection anyway
+        return SQLiteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class SQLiteBackend(MySQLBackend):
+    """The schema of init_sqlite.sql in a SQLite file, or in memory for a
+    throwaway database per connection, so loads run in-process without a
+    MySQL server."""
+
+    name = "sqlite"
+    equals = "IS"
+
+    @staticmethod
+    def fold(value):
+        # TEXT columns compare with the BINARY collation
+        return value
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+
+    def connect(self, session=None):
+        conn = SQLiteConnection(self.path)
+        cursor = conn.conn.cursor()
+        if not cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            with open(SQLITE_SCHEMA, encoding="utf-8") as f:
+                cursor.executescript(f.read())
+
+        for name, value in (session or {}).items():
+            if name.startswith("@"):
+                conn.variables[name[1:]] = value
+            elif name == "foreign_key_checks":
+                cursor.execute(f"PRAGMA foreign_keys = {int(value)}")
+            # autocommit and unique_checks have no SQLite counterpart
+
+        cursor.close()
+        return conn
+
+    def insert(self, table, columns, update=None, select=None):
+        names = ", ".join(f"`{c}`" for c in columns)
+        if not update:
+            rows = select or f"VALUES ({', '.join(['%s'] * len(columns))})"
+            return f"INSERT OR IGNORE INTO `{table}` ({names}) {rows}"
+
+        # a SELECT followed by ON CONFLICT needs a WHERE clause to parse
+        rows = (
+            f"SELECT * FROM ({select}) WHERE true"
+            if select
+            else f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        assignments = ", ".join(f"`{c}` = excluded.`{c}`" for c in update)
+        return (
+            f"INSERT INTO `{table}` ({names}) {rows} "
+            f"ON CONFLICT DO UPDATE SET {assignments}"
+        )
+
+    def update_ratings(self):
+        return """
+            UPDATE `product` SET `rating` = r.`rating`
+            FROM (
+                SELECT `product_id`, AVG(`rating`) AS `rating` FROM `review`
+                {} GROUP BY `product_id`
+            ) r
+            WHERE r.`product_id` = `product`.`id`
+        """
+
+
+# dates are stored as ISO strings like MySQL prints them
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
@@ -0,0 +1,104 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate import Generator
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# main.py arguments per loader mode; staging and sqlite need no database server
+MODES = {
+    "rowwise": ["--backend", "rowwise"],
+    "sqlite": ["--backend", "rowwise", "--sqlite", ":memory:"],
+    "streaming": ["--backend", "rowwise", "--streaming"],
+    "workers": ["--backend", "rowwise", "--streaming", "--workers", str(os.cpu_count())],
+    "pipeline": ["--backend", "rowwise", "--pipeline"],
+    "bulk": ["--backend", "bulk"],
+    "staging": ["--backend", "staging"],
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(mode, data_path, workdir):
+    metrics_path = os.path.join(workdir, f"{mode}.json")
+    command = [
+        sys.executable,
+        os.path.join(HERE, "main.py"),
+        *MODES[mode],
+        "--data-path",
+        data_path,
+        "--staging-dir",
+        os.path.join(workdir, "staging"),
+        "--metrics",
+        metrics_path,
+    ]
+
+    start = time.perf_counter()
+    # errors.log is written to the working directory of the loader
+    process = subprocess.Popen(command, cwd=workdir)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status):
+        return {"mode": mode, "failed": os.waitstatus_to_exitcode(status)}
+
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+
+    items = sum(s["items"] for s in metrics["sources"].values())
+    return {
+        "mode": mode,
+        "wall": wall,
+        # ru_maxrss is in KiB on Linux; children include the parse workers
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "round_trips": metrics["round_trips"],
+        "items": items,
+        "items_per_sec": items / metrics["wall"] if metrics["wall"] else None,
+        "errors": sum(metrics["errors"].values()),
+        "stages": {name: s["wall"] for name, s in metrics["stages"].items()},
+    }
+
+
+def benchmark(scales, modes, output, invalid=0.05, seed=0, data_dir=None):
+    for scale in scales:
+        data_path = os.path.join(data_dir or tempfile.gettempdir(), f"bench-{scale}-{seed}")
+        if not os.path.exists(os.path.join(data_path, "reviews.csv")):
+            Generator(SCALES[scale], invalid, seed).write(data_path)
+
+        for mode in modes:
+            with tempfile.TemporaryDirectory(prefix=f"bench-{mode}-") as workdir:
+                result = run(mode, data_path, workdir)
+
+            result.update(
+                scale=scale,
+                invalid=invalid,
+                seed=seed,
+                time=datetime.datetime.now().isoformat(timespec="seconds"),
+            )
+            print(json.dumps(result))
+            with open(output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="run each loader mode on generated data and append the "
+        "results to a JSON lines file"
+    )
+    parser.add_argument("--scale", nargs="+", choices=SCALES, default=["10k"])
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--invalid", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--data-dir",
+        help="where generated data sets are kept and reused (default: temp dir)",
+    )
+    parser.add_argument("--output", default="benchmark.jsonl")
+    args = parser.parse_args()
+
+    benchmark(args.scale, args.mode, args.output, args.invalid, args.seed, args.data_dir)
@@ -0,0 +1,37 @@
+from backend import MYSQL
+
+
+class WriteBuffer:
+    """Collects rows for one table and writes them as a multi-row INSERT.
+
+    Rows of the unit of work in progress are kept apart so a failed item can
+    drop them without touching rows that are already waiting for the flush.
+    Duplicates are ignored unless `update` names the columns to overwrite.
+    """
+
+    def __init__(self, cursor, table, columns, error_code, update=None, backend=MYSQL):
+        self.cursor = cursor
+        self.table = table
+        self.error_code = error_code
+        self.sql = backend.insert(table, columns, update)
+        self.rows = []
+        self.pending = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, *row):
+        self.pending.append(row)
+
+    def commit(self):
+        self.rows += self.pending
+        self.pending.clear()
+
+    def rollback(self):
+        self.pending.clear()
+
+    def flush(self):
+        rows, self.rows = self.rows, []
+        if rows:
+            self.cursor.executemany(self.sql, rows)
+        return len(rows)
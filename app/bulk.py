@@ -0,0 +1,507 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from backend import MYSQL
+from db import BULK_SESSION, Pool
+from errorlog import error_fields
+from loader import DataLoader, logger
+from metrics import Metrics
+from parsing import (
+    ValidationError,
+    iter_shop,
+    parse_records,
+    parse_review,
+    parse_shop,
+)
+from records import BookSpec, CdSpec, DvdSpec
+
+# staged columns per table, in an order that satisfies the foreign keys
+TABLES = {
+    "address": ("id", "street", "zip"),
+    "branch": ("id", "name", "address_id"),
+    "product": ("id", "asin", "name", "image", "rank"),
+    "publisher": ("id", "name"),
+    "book": ("id", "isbn", "n_pages", "date_published", "publisher_id"),
+    "dvd": ("id", "format", "duration", "region_code"),
+    "cd": ("id", "label", "date_published"),
+    "track": ("cd_id", "title"),
+    "person": ("id", "name"),
+    "person_product": ("person_id", "product_id", "role"),
+    "branch_product": ("branch_id", "product_id", "price", "stock", "state"),
+    "recommendation": ("product_id", "recommended_product_id"),
+    "category": ("id", "name", "parent_id"),
+    "category_closure": ("ancestor_id", "descendant_id", "depth"),
+    "product_category": ("product_id", "category_id"),
+    "customer": ("id", "name"),
+    "review": ("customer_id", "product_id", "rating", "summary", "content"),
+}
+
+FOREIGN_KEYS = [
+    ("recommendation", "product_id", "product"),
+    ("recommendation", "recommended_product_id", "product"),
+    ("book", "id", "product"),
+    ("book", "publisher_id", "publisher"),
+    ("dvd", "id", "product"),
+    ("cd", "id", "product"),
+    ("track", "cd_id", "cd"),
+    ("person_product", "person_id", "person"),
+    ("person_product", "product_id", "product"),
+    ("category", "parent_id", "category"),
+    ("category_closure", "ancestor_id", "category"),
+    ("category_closure", "descendant_id", "category"),
+    ("product_category", "product_id", "product"),
+    ("product_category", "category_id", "category"),
+    ("branch", "address_id", "address"),
+    ("branch_product", "branch_id", "branch"),
+    ("branch_product", "product_id", "product"),
+    ("customer", "address_id", "address"),
+    ("order", "customer_id", "customer"),
+    ("order", "branch_product_id", "branch_product"),
+    ("review", "customer_id", "customer"),
+    ("review", "product_id", "product"),
+]
+
+UNIQUE_KEYS = [
+    ("product", ("asin",)),
+    ("publisher", ("name",)),
+    ("person", ("name",)),
+    ("category", ("name", "parent_id")),
+    ("branch", ("name",)),
+    ("branch_product", ("branch_id", "product_id", "state")),
+]
+
+
+def tsv_value(value):
+    # default LOAD DATA format: tab separated, backslash escaped, \N for NULL
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+    )
+
+
+class StagingFile:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.rows = 0
+
+    def write(self, *row):
+        self.file.write("\t".join(map(tsv_value, row)) + "\n")
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+
+
+class RowCounter:
+    # stands in for a StagingFile when nothing is written
+    def __init__(self):
+        self.rows = 0
+
+    def write(self, *row):
+        self.rows += 1
+
+    def close(self):
+        pass
+
+
+class Stager:
+    """Parses all sources into one TSV file per table, with ids assigned
+    client-side. Needs no database; on its own it serves as a stand-in
+    target for parser benchmarks.
+
+    With `dry_run` no files are written: every validation and reference
+    check still runs against the parsed products, and `report()` sums up
+    the errors with a few offenders each.
+    """
+
+    SAMPLES = 5
+
+    def __init__(self, staging_dir=None, data_path=None, metrics=None, dry_run=False):
+        self.dry_run = dry_run
+        if not dry_run:
+            staging_dir = staging_dir or tempfile.mkdtemp(prefix="staging-")
+        self.staging_dir = staging_dir
+        self.DATA_PATH = data_path or DataLoader.DATA_PATH
+        self.SHOP_FILES = DataLoader.SHOP_FILES
+        self.metrics = metrics or Metrics()
+        self.error_counts = {}
+        self.samples = {}
+        self.files = {}
+        self.ids = {
+            table: {}
+            for table in (
+                "address",
+                "branch",
+                "product",
+                "publisher",
+                "person",
+                "category",
+                "customer",
+            )
+        }
+        self.links = set()
+
+    def log_error(self, code, entity, attribute, message):
+        logger.error(
+            f"{entity} ({attribute}): {code} {message}",
+            extra=error_fields(code, entity, attribute, message),
+        )
+        self.error_counts[code] = self.error_counts.get(code, 0) + 1
+        if len(samples := self.samples.setdefault(code, [])) < self.SAMPLES:
+            samples.append({"entity": entity, "attribute": attribute, "message": str(message)})
+
+    def load(self):
+        with self.metrics.stage("stage"):
+            self.stage()
+
+        for code, count in self.error_counts.items():
+            logger.error(f"Error {code}: {count}")
+
+    def report(self):
+        return {
+            "errors": {
+                code: {"count": count, "samples": self.samples.get(code, [])}
+                for code, count in sorted(self.error_counts.items())
+            },
+            "rows": {table: file.rows for table, file in self.files.items()},
+        }
+
+    def normal(self, key):
+        # keys compare like the UNIQUE keys they stand for, see KeyCache
+        if isinstance(key, tuple):
+            return tuple(MYSQL.fold(v) if isinstance(v, str) else v for v in key)
+        return MYSQL.fold(key) if isinstance(key, str) else key
+
+    def id(self, table, key):
+        return self.ids[table].get(self.normal(key))
+
+    def assign(self, table, key, *row):
+        # ids are handed out in first-seen order, the row is staged only once
+        ids = self.ids[table]
+        if (id := ids.get(key := self.normal(key))) is None:
+            id = ids[key] = len(ids) + 1
+            self.files[table].write(id, *row)
+
+        return id
+
+    def link(self, table, key, *row):
+        if (table, key := self.normal(key)) not in self.links:
+            self.links.add((table, key))
+            self.files[table].write(*row)
+
+    def stage(self):
+        if self.dry_run:
+            self.files = {table: RowCounter() for table in TABLES}
+        else:
+            os.makedirs(self.staging_dir, exist_ok=True)
+            self.files = {
+                table: StagingFile(os.path.join(self.staging_dir, f"{table}.tsv"))
+                for table in TABLES
+            }
+
+        recommendations = []
+        for source in self.SHOP_FILES:
+            recommendations += self.stage_shop(f"{self.DATA_PATH}/{source}")
+
+        for asin, similars in recommendations:
+            self.stage_recommendations(asin, similars)
+
+        # counted like DataLoader counts them, so the modes compare
+        start = time.perf_counter()
+        with self.metrics.stage("parse"):
+            root = ET.parse(f"{self.DATA_PATH}/categories.xml").getroot()
+        self.stage_categories(root)
+        self.metrics.source(
+            "categories.xml", sum(1 for _ in root.iter()) - 1, time.perf_counter() - start
+        )
+
+        self.stage_reviews(f"{self.DATA_PATH}/reviews.csv")
+
+        for file in self.files.values():
+            file.close()
+
+    def stage_shop(self, path):
+        recommendations = []
+        start = time.perf_counter()
+        items = self.metrics.timed("parse", iter_shop(path))
+        try:
+            name, street, zipcode = parse_shop(next(items))
+            address_id = self.assign("address", name, street, zipcode)
+            branch_id = self.assign("branch", name, name, address_id)
+        except ValidationError as e:
+            self.log_error(*e.args)
+            branch_id = None
+
+        for asin, similars, item, error in self.metrics.timed(
+            "validate", parse_records(items)
+        ):
+            recommendations.append((asin, similars))
+            if branch_id is None:
+                continue
+
+            if error:
+                self.log_error(*error)
+                continue
+
+            self.stage_item(item, branch_id)
+
+        self.metrics.source(
+            os.path.basename(path), len(recommendations), time.perf_counter() - start
+        )
+        return recommendations
+
+    def stage_item(self, item, branch_id):
+        asin = item.asin
+        new = self.id("product", asin) is None
+        product_id = self.assign(
+            "product", asin, asin, item.name, item.image, item.rank
+        )
+
+        if new and isinstance(cd := item.spec, CdSpec):
+            self.files["cd"].write(product_id, cd.label, cd.date_published)
+            for title in cd.tracks:
+                self.files["track"].write(product_id, title)
+
+        elif new and isinstance(dvd := item.spec, DvdSpec):
+            self.files["dvd"].write(
+                product_id, dvd.format, dvd.duration, dvd.region_code
+            )
+
+        elif isinstance(book := item.spec, BookSpec):
+            # create_item writes the publisher of a known product too
+            publisher = book.publisher
+            publisher_id = self.assign("publisher", publisher, publisher)
+            if new:
+                self.files["book"].write(
+                    product_id,
+                    book.isbn,
+                    book.n_pages,
+                    book.date_published,
+                    publisher_id,
+                )
+
+        for person in item.persons:
+            person_id = self.assign("person", person.name, person.name)
+            self.link(
+                "person_product",
+                (person_id, product_id, person.role),
+                person_id,
+                product_id,
+                person.role,
+            )
+
+        offer = item.offer
+        self.link(
+            "branch_product",
+            (branch_id, product_id, offer.state),
+            branch_id,
+            product_id,
+            offer.price,
+            offer.stock,
+            offer.state,
+        )
+
+    def stage_recommendations(self, asin, similars):
+        if not asin:
+            self.log_error(43, asin, "asin", "Missing asin")
+            return
+
+        if (product_id := self.id("product", asin)) is None:
+            self.log_error(44, asin, "asin", "ASIN not found")
+            return
+
+        for asin in similars:
+            if not asin:
+                self.log_error(45, asin, "asin", "Missing asin in recommendation")
+                continue
+
+            if (rec_id := self.id("product", asin)) is None:
+                self.log_error(46, asin, "asin", "Recommendation ASIN not found")
+                continue
+
+            self.link("recommendation", (product_id, rec_id), product_id, rec_id)
+
+    def stage_categories(self, root, parent_id=None, ancestors=()):
+        for item in root:
+            if item.tag == "category":
+                name = (item.text or "").strip()
+                if not name:
+                    self.log_error(9, "Category", "name", "Missing name")
+                    continue
+
+                category_id = self.assign("category", (name, parent_id), name, parent_id)
+                path = (*ancestors, category_id)
+                for depth, ancestor_id in enumerate(reversed(path)):
+                    self.link(
+                        "category_closure",
+                        (ancestor_id, category_id),
+                        ancestor_id,
+                        category_id,
+                        depth,
+                    )
+                self.stage_categories(item, category_id, path)
+
+            elif item.tag == "item":
+                asin = item.text
+                if not asin:
+                    self.log_error(11, "CategoryItem", "asin", "Missing ASIN")
+                    continue
+
+                if (product_id := self.id("product", asin)) is None:
+                    self.log_error(12, asin, "product", "Missing product")
+                    continue
+
+                self.link(
+                    "product_category",
+                    (product_id, parent_id),
+                    product_id,
+                    parent_id,
+                )
+
+    def stage_reviews(self, path):
+        start, index = time.perf_counter(), -1
+        with open(path) as f:
+            reader = csv.DictReader(f)
+            for index, row in enumerate(self.metrics.timed("parse", reader)):
+                try:
+                    review = parse_review(row)
+                except ValidationError as e:
+                    self.log_error(*e.args)
+                    continue
+
+                asin = review["asin"]
+                if (product_id := self.id("product", asin)) is None:
+                    self.log_error(6, asin, "product", "Missing reviewed product")
+                    continue
+
+                customer = review["customer"]
+                customer_id = self.assign("customer", customer, customer)
+                self.link(
+                    "review",
+                    (product_id, customer_id),
+                    customer_id,
+                    product_id,
+                    review["rating"],
+                    review["summary"],
+                    review["content"],
+                )
+
+        self.metrics.source(os.path.basename(path), index + 1, time.perf_counter() - start)
+
+
+class BulkLoader(DataLoader):
+    """Full reload: stages every table as TSV with client-side ids, then
+    replaces the table contents with LOAD DATA LOCAL INFILE, one table per
+    pooled connection and `workers` tables at a time."""
+
+    def __init__(self, staging_dir=None, workers=None, **kwargs):
+        super().__init__(allow_local_infile=True, **kwargs)
+        self.stager = Stager(staging_dir, self.DATA_PATH, self.metrics)
+        self.workers = workers or 4
+
+    def load(self):
+        with self.metrics.stage("stage"):
+            self.stage()
+        with self.metrics.stage("import"):
+            self.import_staged()
+        self.bump_generation()
+
+        for code, count in self.stager.error_counts.items():
+            self.error_counts[code] = self.error_counts.get(code, 0) + count
+
+        for code, count in self.error_counts.items():
+            logger.error(f"Error {code}: {count}")
+
+        self.close()
+
+    def stage(self):
+        self.stager.stage()
+
+    def load_table(self, pool, table):
+        # runs in a worker thread, the round trip is recorded by the caller
+        columns = ", ".join(f"`{c}`" for c in TABLES[table])
+        sql = (
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` "
+            f"CHARACTER SET utf8mb4 ({columns})"
+        )
+        conn = pool.connect()
+        try:
+            cursor = conn.cursor()
+            start = time.perf_counter()
+            cursor.execute(sql, (self.stager.files[table].path,))
+            conn.commit()
+            return sql, cursor.rowcount, time.perf_counter() - start
+        finally:
+            conn.close()
+
+    def import_staged(self):
+        # LOAD DATA fires the review and person_product triggers; ratings are
+        # computed afterwards, the roles are staged resolved already
+        session = {**BULK_SESSION, "@skip_rating_trigger": 1, "@skip_role_trigger": 1}
+        for name, value in session.items():
+            self.cursor.execute(f"SET {name} = %s", (value,))
+
+        # everything that can fail before the tables are emptied: the staged
+        # files and the connections of the pool
+        for table in TABLES:
+            if not os.access(path := self.stager.files[table].path, os.R_OK):
+                raise FileNotFoundError(f"{table} is not staged: {path}")
+
+        # without the checks the tables do not depend on each other;
+        # connect_args already allow LOCAL INFILE
+        pool = Pool(self.workers, "bulk", session, **self.connect_args)
+
+        # a full reload also invalidates the progress of earlier row-wise
+        # loads; emptied right before the tables are loaded again
+        for table in [*TABLES, "load_checkpoint", "load_item"]:
+            self.cursor.execute(f"TRUNCATE TABLE `{table}`")
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            for sql, rows, wall in executor.map(
+                lambda table: self.load_table(pool, table), TABLES
+            ):
+                self.metrics.statement(sql, rows, wall)
+
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+        self.cursor.execute("SET unique_checks = 1")
+        self.cursor.execute("SET foreign_key_checks = 1")
+
+        with self.metrics.stage("ratings"):
+            self.update_ratings()
+
+        with self.metrics.stage("summaries"):
+            self.summaries.refresh(full=True)
+            self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+        with self.metrics.stage("validate"):
+            self.validate()
+
+    def validate(self):
+        # the checks skipped during the import, run once over the loaded tables
+        for table, column, ref in FOREIGN_KEYS:
+            sql = f"""
+                SELECT COUNT(*) FROM `{table}` t LEFT JOIN `{ref}` r ON t.`{column}` = r.`id`
+                WHERE t.`{column}` IS NOT NULL AND r.`id` IS NULL
+            """
+            self.cursor.execute(sql)
+            if count := self.cursor.fetchone()[0]:
+                self.log_error(48, table, column, f"{count} rows reference a missing {ref}")
+
+        for table, columns in UNIQUE_KEYS:
+            columns = ", ".join(f"`{c}`" for c in columns)
+            sql = f"""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM `{table}` GROUP BY {columns} HAVING COUNT(*) > 1
+                ) d
+            """
+            self.cursor.execute(sql)
+            if count := self.cursor.fetchone()[0]:
+                self.log_error(49, table, columns, f"{count} duplicate keys")
@@ -0,0 +1,114 @@
+import hashlib
+
+from backend import MYSQL
+
+
+def file_hash(*paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+
+    return h.hexdigest()
+
+
+def item_digest(item):
+    return hashlib.md5(repr(item).encode()).hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, source, file_hash, skip_until=0, done=False, digests=None):
+        self.source = source
+        self.file_hash = file_hash
+        # set when the stored progress is for the same file contents
+        self.skip_until = skip_until
+        self.done = done
+        self.position = skip_until
+        self.completed = done
+        self.digests = digests
+
+    def skip(self, index):
+        return index < self.skip_until
+
+    def unchanged(self, key, item):
+        # incremental mode: remembers the digest and reports whether the item
+        # looked exactly like this on the previous load
+        if self.digests is None:
+            return False
+
+        digest = item_digest(item)
+        if self.digests.get(key) == digest:
+            return True
+
+        self.digests[key] = digest
+        return False
+
+    def complete(self):
+        self.completed = True
+
+
+class Checkpoints:
+    """Per-source load progress, stored in `load_checkpoint`.
+
+    Progress is always recorded. With mode "resume", a source whose file is
+    unchanged continues after the last committed position. With mode
+    "incremental", unchanged sources are skipped and items are only written
+    when their digest (kept in `load_item`) differs from the previous load.
+    """
+
+    def __init__(self, cursor, mode=None, backend=MYSQL):
+        self.cursor = cursor
+        self.mode = mode
+        self.backend = backend
+        self.stored = {}
+        self.digests = {}
+        self.active = []
+
+    def warm(self):
+        self.cursor.execute(
+            "SELECT source, file_hash, position, completed FROM load_checkpoint"
+        )
+        self.stored = {
+            source: (file_hash, position, bool(completed))
+            for source, file_hash, position, completed in self.cursor.fetchall()
+        }
+
+        if self.mode == "incremental":
+            self.cursor.execute("SELECT source, item_key, digest FROM load_item")
+            for source, key, digest in self.cursor.fetchall():
+                self.digests.setdefault(source, {})[key] = digest
+
+    def start(self, source, file_hash):
+        stored_hash, position, completed = self.stored.get(source, (None, 0, False))
+        unchanged = self.mode is not None and stored_hash == file_hash
+
+        done = unchanged and completed
+        checkpoint = Checkpoint(
+            source,
+            file_hash,
+            skip_until=position if done or (unchanged and self.mode == "resume") else 0,
+            done=done,
+            digests=(
+                self.digests.setdefault(source, {})
+                if self.mode == "incremental"
+                else None
+            ),
+        )
+        self.active.append(checkpoint)
+        return checkpoint
+
+    def save(self):
+        # runs in the transaction of the batch it describes
+        if not self.active:
+            return
+
+        sql = self.backend.insert(
+            "load_checkpoint",
+            ("source", "file_hash", "position", "completed"),
+            update=("file_hash", "position", "completed"),
+        )
+        self.cursor.executemany(
+            sql,
+            [(c.source, c.file_hash, c.position, c.completed) for c in self.active],
+        )
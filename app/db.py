@@ -0,0 +1,90 @@
+import os
+
+import mysql.connector
+from mysql.connector import pooling
+
+# session variables for a bulk load; the import is validated afterwards
+BULK_SESSION = {
+    "autocommit": 0,
+    "unique_checks": 0,
+    "foreign_key_checks": 0,
+}
+
+# the row-wise loader relies on the UNIQUE keys for INSERT IGNORE and
+# ON DUPLICATE KEY UPDATE and is not validated afterwards, so it keeps them
+ROW_SESSION = {
+    "autocommit": 0,
+    "foreign_key_checks": 0,
+}
+
+
+def settings(**overrides):
+    """Connection arguments from the environment, overridden by the values
+    in `overrides` that are not None (e.g. from the command line)."""
+    config = {
+        "host": os.getenv("DATABASE_HOST", "db"),
+        "port": int(os.getenv("DATABASE_PORT", 3306)),
+        "user": os.getenv("DATABASE_USER", "root"),
+        "password": os.getenv("DATABASE_PASSWORD"),
+        "database": os.getenv("DATABASE_NAME", "media_store"),
+        # the C extension is used when it is installed, unless DATABASE_USE_PURE=1
+        "use_pure": os.getenv("DATABASE_USE_PURE") == "1",
+    }
+    config.update((k, v) for k, v in overrides.items() if v is not None)
+    return config
+
+
+def apply_session(conn, session):
+    cursor = conn.cursor()
+    for name, value in (session or {}).items():
+        # user variables like @skip_rating_trigger have no scope
+        scope = "" if name.startswith("@") else "SESSION "
+        cursor.execute(f"SET {scope}{name} = %s", (value,))
+    cursor.close()
+
+
+def connect(session=None, **overrides):
+    conn = mysql.connector.connect(**settings(**overrides))
+    apply_session(conn, session)
+    return conn
+
+
+class Pool:
+    """A fixed number of connections shared by threads. Every connection that
+    is handed out gets the session variables of the pool; closing it returns
+    it to the pool."""
+
+    def __init__(self, size, name="loader", session=None, **overrides):
+        self.session = session
+        self.pool = pooling.MySQLConnectionPool(
+            pool_name=name, pool_size=size, **settings(**overrides)
+        )
+
+    def connect(self):
+        conn = self.pool.get_connection()
+        apply_session(conn, self.session)
+        return conn
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group(
+        "database", "defaults come from DATABASE_HOST, DATABASE_PORT, ..."
+    )
+    group.add_argument("--db-host", dest="host")
+    group.add_argument("--db-port", dest="port", type=int)
+    group.add_argument("--db-user", dest="user")
+    group.add_argument("--db-name", dest="database")
+    group.add_argument(
+        "--pure",
+        dest="use_pure",
+        action="store_const",
+        const=True,
+        help="use the pure Python protocol instead of the C extension",
+    )
+
+
+def arguments(args):
+    return {
+        name: getattr(args, name)
+        for name in ("host", "port", "user", "database", "use_pure")
+    }
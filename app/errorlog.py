@@ -0,0 +1,55 @@
+import atexit
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+
+def error_fields(code, entity, attribute, message):
+    # attached to the log record, picked up by the JSON lines handler
+    return {
+        "code": code,
+        "entity": entity,
+        "attribute": attribute,
+        "detail": str(message),
+    }
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(
+            {
+                "time": record.created,
+                "code": record.code,
+                "entity": record.entity,
+                "attribute": record.attribute,
+                "message": record.detail,
+            },
+            default=str,
+        )
+
+
+def start_logging(path="errors.log", jsonl_path=None):
+    """Routes the root logger through a queue, so a loader only enqueues its
+    error records; a background thread formats and writes them to `path` and,
+    for records from log_error, as JSON lines to `jsonl_path`."""
+    handler = logging.FileHandler(path, mode="w")
+    handler.setFormatter(logging.Formatter("%(message)s\n"))
+    handlers = [handler]
+
+    if jsonl_path:
+        handler = logging.FileHandler(jsonl_path, mode="w")
+        handler.setFormatter(JsonLinesFormatter())
+        handler.addFilter(lambda record: hasattr(record, "code"))
+        handlers.append(handler)
+
+    queue = SimpleQueue()
+    logger = logging.getLogger()
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(QueueHandler(queue))
+
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # drains the queue before the process exits
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+# the validation codes of parsing.py that a generated record can trigger
+ITEM_ERRORS = {
+    "Book": [14, 15, 16, 30, 31, 32, 33, 38],
+    "Music": [14, 15, 16, 18, 19, 38],
+    "DVD": [14, 15, 16, 24, 25, 26, 38],
+}
+CATEGORY_ERRORS = [9, 11, 12]
+RECOMMENDATION_ERRORS = [45, 46]
+REVIEW_ERRORS = [1, 2, 3, 4, 5, 6]
+
+WORDS = (
+    "the of night river stone blue music garden silent city road winter "
+    "light house dream paper golden secret last first story song"
+).split()
+
+
+def words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).title()
+
+
+def asin(n):
+    return f"G{n:09d}"
+
+
+def date(rng):
+    return f"{rng.randint(1960, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def people(rng, tag, count, pool):
+    return "".join(
+        f"<{tag} name={quoteattr(f'Person {rng.randrange(pool)}')}/>"
+        for _ in range(count)
+    )
+
+
+class Generator:
+    """Writes shop feeds, a category tree and a review dump in the formats the
+    loader reads. `invalid` is the share of records that get exactly one
+    defect matching one of the loader's error codes."""
+
+    def __init__(self, items, invalid=0.05, seed=0):
+        self.items = items
+        self.invalid = invalid
+        self.rng = random.Random(seed)
+        self.persons = max(10, items // 4)
+
+    def defect(self, codes):
+        return self.rng.choice(codes) if self.rng.random() < self.invalid else None
+
+    def item(self, n):
+        rng = self.rng
+        pgroup = ("Book", "Music", "DVD")[n % 3]
+        error = self.defect(ITEM_ERRORS[pgroup])
+
+        similars = "".join(
+            f"<sim_product><asin>{self.similar(n)}</asin></sim_product>"
+            for _ in range(rng.randint(0, 4))
+        )
+        parts = [
+            f"<item pgroup={quoteattr('Game' if error == 15 else pgroup)}"
+            f" asin={quoteattr('' if error == 14 else asin(n))}"
+            f' salesrank="{rng.randint(1, 100000)}">',
+            f"<title>{'' if error == 16 else escape(words(rng, 3))}</title>",
+            f'<price state="{"broken" if error == 38 else rng.choice(["new", "used"])}"'
+            f' mult="0.01" currency="EUR">{rng.choice(["", rng.randint(100, 9999)])}</price>',
+            f"<similars>{similars}</similars>",
+        ]
+
+        authors, artists, actors, creators, directors = "", "", "", "", ""
+        labels, publishers, tracks = "", "", ""
+        bookspec, musicspec, dvdspec = "", "", ""
+        if pgroup == "Book":
+            authors = people(rng, "author", rng.randint(1, 3), self.persons)
+            if error != 33:
+                publishers = f"<publisher name={quoteattr(words(rng, 2))}/>"
+            bookspec = (
+                f"<isbn val=\"{'' if error == 30 else rng.randint(10**9, 10**10 - 1)}\"/>"
+                f"<pages>{'' if error == 31 else rng.randint(20, 900)}</pages>"
+                f"<publication date=\"{'' if error == 32 else date(rng)}\"/>"
+            )
+        elif pgroup == "Music":
+            artists = people(rng, "artist", rng.randint(1, 2), self.persons)
+            if error != 18:
+                labels = f"<label name={quoteattr(words(rng, 2))}/>"
+            tracks = "".join(
+                f"<title>{escape(words(rng, 2))}</title>"
+                for _ in range(rng.randint(1, 15))
+            )
+            musicspec = f"<releasedate>{'' if error == 19 else date(rng)}</releasedate>"
+        else:
+            actors = people(rng, "actor", rng.randint(0, 4), self.persons)
+            creators = people(rng, "creator", rng.randint(0, 2), self.persons)
+            directors = people(rng, "director", 1, self.persons)
+            dvdspec = (
+                f"<format>{'' if error == 24 else 'PAL'}</format>"
+                f"<regioncode>{'' if error == 26 else 2}</regioncode>"
+                f"<runningtime>{'' if error == 25 else rng.randint(60, 200)}</runningtime>"
+            )
+
+        parts += [
+            f"<authors>{authors}</authors><artists>{artists}</artists>",
+            f"<actors>{actors}</actors><creators>{creators}</creators>",
+            f"<directors>{directors}</directors><labels>{labels}</labels>",
+            f"<publishers>{publishers}</publishers><tracks>{tracks}</tracks>",
+            f"<bookspec>{bookspec}</bookspec><musicspec>{musicspec}</musicspec>",
+            f"<dvdspec>{dvdspec}</dvdspec></item>\n",
+        ]
+        return "".join(parts)
+
+    def similar(self, n):
+        error = self.defect(RECOMMENDATION_ERRORS)
+        if error == 45:
+            return ""
+        if error == 46:
+            return asin(self.items + n)
+        return asin(self.rng.randrange(self.items))
+
+    def shop(self, path, name, street, zipcode, share):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+            f.write(
+                f"<shop name={quoteattr(name)} street={quoteattr(street)}"
+                f" zip={quoteattr(zipcode)}>"
+            )
+            for n in range(self.items):
+                if self.rng.random() < share:
+                    f.write(self.item(n))
+            f.write("</shop>\n")
+
+    def categories(self, path, roots=5, fanout=4, depth=3):
+        rng = self.rng
+
+        def category(f, level):
+            name = " " if self.defect([9]) else escape(words(rng, 2))
+            f.write(f"<category>{name}\n")
+            for _ in range(rng.randint(1, 8)):
+                error = self.defect(CATEGORY_ERRORS[1:])
+                if error == 11:
+                    f.write("<item></item>\n")
+                elif error == 12:
+                    f.write(f"<item>{asin(self.items + rng.randrange(self.items))}</item>\n")
+                else:
+                    f.write(f"<item>{asin(rng.randrange(self.items))}</item>\n")
+            if level < depth:
+                for _ in range(rng.randint(1, fanout)):
+                    category(f, level + 1)
+            f.write("</category>\n")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="utf-8" ?>\n<categories>')
+            for _ in range(roots):
+                category(f, 1)
+            f.write("</categories>\n")
+
+    def reviews(self, path, per_item=2):
+        rng = self.rng
+        customers = max(10, self.items // 2)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["product", "rating", "helpful", "reviewdate", "user", "summary", "content"]
+            )
+            for _ in range(self.items * per_item):
+                error = self.defect(REVIEW_ERRORS)
+                product = asin(rng.randrange(self.items))
+                writer.writerow(
+                    [
+                        "" if error == 1 else asin(self.items + 1) if error == 6 else product,
+                        "" if error == 2 else rng.randint(1, 5),
+                        rng.randint(0, 50),
+                        date(rng),
+                        "" if error == 3 else f"customer{rng.randrange(customers)}",
+                        "" if error == 4 else words(rng, 3),
+                        "" if error == 5 else words(rng, 20),
+                    ]
+                )
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.shop(
+            os.path.join(directory, "leipzig_transformed.xml"),
+            "Leipzig",
+            "Hauptstraße 1, Leipzig",
+            "04109",
+            0.7,
+        )
+        self.shop(
+            os.path.join(directory, "dresden.xml"),
+            "Dresden",
+            "Johann-Meyer-Straße",
+            "01097",
+            0.6,
+        )
+        self.categories(os.path.join(directory, "categories.xml"))
+        self.reviews(os.path.join(directory, "reviews.csv"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="write a synthetic data set in the loader's input formats"
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument(
+        "--invalid",
+        type=float,
+        default=0.05,
+        help="share of records with a defect the loader reports",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Generator(args.items, args.invalid, args.seed).write(args.directory)
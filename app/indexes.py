@@ -0,0 +1,309 @@
+import argparse
+import os
+import re
+import time
+
+import mysql.connector
+
+import db
+from resolver import Resolver
+
+SELECT_SQL = os.path.join(os.path.dirname(__file__), "..", "select.sql")
+
+# the secondary indexes init.sql ships for the loader lookups and the
+# reports; --rebuild drops them first, so the advisor has to derive them
+# again and the timings show what they gain
+INDEXES = [
+    ("customer", "customer_name", ("name",)),
+    ("review", "review_rating_product", ("rating", "product_id")),
+]
+# indexes of earlier schemas that no query needs any more, but every INSERT
+# maintains; the prices are read from product_price_summary
+OBSOLETE = [
+    ("branch_product", "branch_product_product_price"),
+]
+# longest index proposed, equality columns first
+MAX_COLUMNS = 3
+
+TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+`?(\w+)`?"
+    r"(?:\s+(?:AS\s+)?(?!(?:ON|JOIN|LEFT|RIGHT|INNER|CROSS|WHERE|GROUP|ORDER"
+    r"|LIMIT|UNION|INTERSECT|EXCEPT)\b)`?(\w+)`?)?",
+    re.IGNORECASE,
+)
+COLUMN_REF = re.compile(r"(?:`?(\w+)`?\.)?`?([A-Za-z_]\w*)`?")
+EQUALS = re.compile(r"<=>|(?<![<>!])=")
+
+
+def loader_queries():
+    # the statements the loader issues per record, with a sample key
+    queries = {
+        f"{cache.table} lookup": (
+            cache.lookup,
+            ("",) * len(cache.columns),
+        )
+        for cache in Resolver(None).caches
+    }
+    queries["branch lookup"] = ("SELECT id FROM branch WHERE name = %s", ("",))
+    return queries
+
+
+def report_queries(path=SELECT_SQL):
+    # select.sql is a list of statements, each headed by a comment line
+    queries = {}
+    with open(path, encoding="utf-8") as f:
+        for statement in f.read().split(";"):
+            lines = statement.strip().splitlines()
+            title = [l[2:].strip() for l in lines if l.startswith("--")]
+            sql = "\n".join(l for l in lines if not l.startswith("--"))
+            if sql.strip():
+                queries[title[0] if title else sql[:40]] = (sql, None)
+
+    return queries
+
+
+def full_scans(cursor, sql, params):
+    # (table or alias, estimated rows) of every table EXPLAIN reads in full
+    cursor.execute(f"EXPLAIN {sql}", params)
+    return [
+        (row["table"], row["rows"])
+        for row in cursor.fetchall()
+        if row["type"] == "ALL"
+    ]
+
+
+def table_refs(sql):
+    # alias -> table of every FROM and JOIN
+    return {
+        (alias or table): table for table, alias in TABLE_REF.findall(sql)
+    }
+
+
+def equality_columns(sql):
+    # (qualifier, column) on either side of = and <=>
+    for match in EQUALS.finditer(sql):
+        left = re.search(rf"{COLUMN_REF.pattern}\s*$", sql[: match.start()])
+        right = re.match(rf"\s*{COLUMN_REF.pattern}", sql[match.end() :])
+        for operand in (left, right):
+            if operand:
+                yield operand.groups()
+
+
+def candidate(sql, alias, schema):
+    """The index a full scan of `alias` in `sql` asks for, as (table,
+    columns, number of equality columns): the columns it is compared on with
+    =, then the other columns the statement reads from it, so the index also
+    covers the query. None if it is not filtered or joined on any column."""
+    tables = table_refs(sql)
+    if (table := tables.get(alias)) not in schema:
+        return None
+
+    columns, primary = schema[table]
+    # InnoDB appends a surrogate id to every index anyway
+    primary = primary if len(primary) == 1 else set()
+    single = len(set(tables.values())) == 1
+
+    def own(qualifier, column):
+        if column not in columns or column in primary:
+            return False
+        return qualifier == alias or (not qualifier and single)
+
+    keys = []
+    for qualifier, column in equality_columns(sql):
+        if own(qualifier, column) and column not in keys:
+            keys.append(column)
+    if not keys:
+        return None
+
+    read = [
+        column
+        for qualifier, column in COLUMN_REF.findall(sql)
+        if own(qualifier, column) and column not in keys
+    ]
+    index = tuple(dict.fromkeys(keys + read))[: max(MAX_COLUMNS, len(keys))]
+    return table, index, len(keys)
+
+
+def schema_of(cursor):
+    # table -> (columns, primary key columns)
+    cursor.execute(
+        """
+        SELECT table_name AS table_name, column_name AS column_name,
+        column_key AS column_key
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        """
+    )
+    schema = {}
+    for row in cursor.fetchall():
+        columns, primary = schema.setdefault(row["table_name"], (set(), set()))
+        columns.add(row["column_name"])
+        if row["column_key"] == "PRI":
+            primary.add(row["column_name"])
+
+    return schema
+
+
+def existing_indexes(cursor):
+    # (table, index name) -> columns in index order
+    cursor.execute(
+        """
+        SELECT table_name AS table_name, index_name AS index_name,
+        column_name AS column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        ORDER BY table_name, index_name, seq_in_index
+        """
+    )
+    indexes = {}
+    for row in cursor.fetchall():
+        key = (row["table_name"], row["index_name"])
+        indexes.setdefault(key, []).append(row["column_name"])
+
+    return indexes
+
+
+def timing(cursor, sql, params, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def analyze(cursor, queries, repeat):
+    results = {}
+    for name, (sql, params) in queries.items():
+        try:
+            results[name] = (
+                full_scans(cursor, sql, params),
+                timing(cursor, sql, params, repeat),
+            )
+        except mysql.connector.Error as e:
+            results[name] = (None, str(e))
+
+    return results
+
+
+def create_index(table, name, columns):
+    return f"CREATE INDEX `{name}` ON `{table}` ({', '.join(f'`{c}`' for c in columns)})"
+
+
+def migration(cursor, queries, results):
+    """(table, statement): CREATE INDEX for every full scan that filters or
+    joins on columns no index starts with, DROP INDEX for the obsolete
+    indexes."""
+    schema = schema_of(cursor)
+    indexes = existing_indexes(cursor)
+    proposed = {}
+    for name, (scans, _) in results.items():
+        sql = queries[name][0]
+        for alias, _ in scans or ():
+            if (found := candidate(sql, alias, schema)) is None:
+                continue
+
+            table, columns, keys = found
+            served = any(
+                t == table and set(existing[:keys]) == set(columns[:keys])
+                for (t, _), existing in indexes.items()
+            )
+            if not served:
+                proposed.setdefault((table, f"{table}_{'_'.join(columns)}"), columns)
+
+    statements = [
+        (table, create_index(table, index, columns))
+        for (table, index), columns in proposed.items()
+    ]
+    statements += [
+        (table, f"DROP INDEX `{index}` ON `{table}`")
+        for table, index in OBSOLETE
+        if (table, index) in indexes
+    ]
+    return statements
+
+
+def print_report(before, after=None):
+    for name, (scans, seconds) in before.items():
+        print(f"-- {name}")
+        if scans is None:
+            print(f"   failed: {seconds}")
+            continue
+
+        for table, rows in scans:
+            print(f"   full scan of {table} (~{rows} rows)")
+
+        line = f"   {seconds * 1000:.2f} ms"
+        if after and after[name][0] is not None:
+            line += f" -> {after[name][1] * 1000:.2f} ms"
+            for table, rows in after[name][0]:
+                line += f"\n   still scans {table} (~{rows} rows)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN the loader lookups and the select.sql reports, "
+        "flag full table scans and derive the indexes they are missing"
+    )
+    parser.add_argument("--queries", default=SELECT_SQL, help="path to select.sql")
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="run the migration and time every query again",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="drop the indexes init.sql ships for the loader and the reports "
+        "first, so the before/after timings show what they gain (with --apply)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs per query, the fastest one is reported",
+    )
+    db.add_arguments(parser)
+    args = parser.parse_args()
+    if args.rebuild and not args.apply:
+        parser.error("--rebuild drops indexes, it needs --apply")
+
+    conn = db.connect(**db.arguments(args))
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    queries = {**loader_queries(), **report_queries(args.queries)}
+    if args.rebuild:
+        indexes = existing_indexes(cursor)
+        for table, index, _ in INDEXES:
+            if (table, index) in indexes:
+                cursor.execute(f"DROP INDEX `{index}` ON `{table}`")
+    before = analyze(cursor, queries, args.repeat)
+
+    statements = migration(cursor, queries, before)
+    for _, sql in statements:
+        print(f"{sql};")
+
+    after = None
+    if args.apply and statements:
+        for _, sql in statements:
+            cursor.execute(sql)
+        for table in {table for table, _ in statements}:
+            cursor.execute(f"ANALYZE TABLE `{table}`")
+            cursor.fetchall()
+        after = analyze(cursor, queries, args.repeat)
+
+    print_report(before, after)
+
+    if args.rebuild:
+        # the schema is left as init.sql has it, also where the advisor
+        # proposed other indexes
+        indexes = existing_indexes(cursor)
+        for table, index, columns in INDEXES:
+            if (table, index) not in indexes:
+                print(f"-- not derived again: {index}")
+                cursor.execute(create_index(table, index, columns))
+    cursor.close()
+    conn.close()
@@ -0,0 +1,905 @@
+from collections import Counter
+import csv
+from itertools import islice
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from backend import MySQLBackend
+from buffer import WriteBuffer
+from checkpoint import Checkpoints, file_hash
+from errorlog import error_fields
+from metrics import InstrumentedCursor, Metrics
+from parallel import parse_shop_parallel, read_review_chunks
+from parsing import (
+    ValidationError,
+    iter_shop,
+    parse_records,
+    parse_review,
+    parse_shop,
+    similar_asins,
+)
+from records import BookSpec, CdSpec, DvdSpec
+from resolver import Resolver
+from summary import Summaries
+
+logger = logging.getLogger()
+
+
+# insert failures for a contributor keep the error code of its product type
+PERSON_ERRORS = {
+    "ARTIST": 22,
+    "ACTOR": 28,
+    "CREATOR": 28,
+    "DIRECTOR": 28,
+    "AUTHOR": 36,
+}
+
+
+class DataLoader:
+    DATA_PATH = os.path.join(os.path.dirname(__file__), "data/")
+    SHOP_FILES = ("leipzig_transformed.xml", "dresden.xml")
+    error_counts = {}
+
+    def __init__(
+        self,
+        data_path=None,
+        cache_size=None,
+        batch_size=1000,
+        checkpoint_mode=None,
+        ratings="deferred",
+        set_based=False,
+        prepared=False,
+        session=None,
+        backend=None,
+        **connect_args,
+    ):
+        if data_path:
+            self.DATA_PATH = data_path
+
+        # parse_item assigns the role of the product group already, so the
+        # person_product trigger is bypassed for this session; with deferred
+        # ratings so are the review triggers, and update_ratings runs once
+        # after the reviews are loaded
+        session = {**(session or {}), "@skip_role_trigger": 1}
+        self.deferred_ratings = ratings == "deferred"
+        if self.deferred_ratings:
+            session["@skip_rating_trigger"] = 1
+
+        self.connect_args = connect_args
+        self.backend = backend or MySQLBackend(**connect_args)
+        self.conn = self.backend.connect(session)
+        self.metrics = Metrics()
+        self.cursor = InstrumentedCursor(self.conn.cursor(), self.metrics)
+        # single-row statements of a unit of work go through server-side
+        # prepared statements, one cursor per SQL template so each is prepared
+        # once; multi-row INSERTs always use the plain cursor
+        self.prepared = {} if prepared else None
+        # the cursor of the last single-row statement, for lastrowid/rowcount
+        self.statements = self.cursor
+        self.keys = Resolver(self.cursor, cache_size, self.backend)
+        self.checkpoints = Checkpoints(self.cursor, checkpoint_mode, self.backend)
+        self.rated = set()
+        self.summaries = Summaries(self.cursor, batch_size, self.backend)
+        # whole sources in one pass with multi-row inserts instead of a unit
+        # of work per record
+        self.set_based = set_based
+
+        # an incremental load overwrites offers and reviews of changed items
+        incremental = checkpoint_mode == "incremental"
+        offer_update = ("price", "stock") if incremental else None
+        review_update = ("rating", "summary", "content") if incremental else None
+        self.batch_size = batch_size
+        self.buffers = {
+            table: WriteBuffer(
+                self.cursor, table, columns, error_code, update, self.backend
+            )
+            for table, columns, error_code, update in [
+                (
+                    "branch_product",
+                    ("product_id", "branch_id", "price", "state", "stock"),
+                    39,
+                    offer_update,
+                ),
+                ("person_product", ("person_id", "product_id", "role"), 29, None),
+                (
+                    "review",
+                    ("customer_id", "product_id", "rating", "summary", "content"),
+                    8,
+                    review_update,
+                ),
+                ("recommendation", ("product_id", "recommended_product_id"), 47, None),
+                ("product_category", ("product_id", "category_id"), 13, None),
+                ("category_closure", ("ancestor_id", "descendant_id", "depth"), 51, None),
+                # last, so a digest is only written with the rows it stands for
+                ("load_item", ("source", "item_key", "digest"), 50, ("digest",)),
+            ]
+        }
+        self.sql = {
+            table: self.backend.insert(table, columns)
+            for table, columns in [
+                ("cd", ("id", "label", "date_published")),
+                ("dvd", ("id", "format", "duration", "region_code")),
+                ("book", ("id", "isbn", "n_pages", "date_published", "publisher_id")),
+            ]
+        }
+        self.units = 0
+        self.in_unit = False
+        self.savepoint = False
+
+    def begin(self):
+        # direct inserts of a unit of work (item, review, category) can be
+        # undone on their own while the surrounding batch stays open; the
+        # savepoint is only set by the first write, so a unit that is
+        # rejected before writing costs no round trip
+        self.in_unit = True
+        self.savepoint = False
+
+    def execute(self, sql, val, many=False):
+        if self.in_unit and not self.savepoint:
+            self.cursor.execute("SAVEPOINT unit")
+            self.savepoint = True
+
+        if many:
+            self.cursor.executemany(sql, val)
+        elif self.prepared is None:
+            self.cursor.execute(sql, val)
+        else:
+            # the cursor re-prepares unless it gets the very same string object
+            if (prepared := self.prepared.get(sql)) is None:
+                cursor = self.conn.cursor(prepared=True)
+                prepared = self.prepared[sql] = (
+                    sql,
+                    InstrumentedCursor(cursor, self.metrics),
+                )
+            sql, self.statements = prepared
+            self.statements.execute(sql, val)
+
+    def commit(self):
+        self.in_unit = False
+        self.savepoint = False
+        self.keys.commit()
+        for buffer in self.buffers.values():
+            buffer.commit()
+
+        self.units += 1
+        if self.units >= self.batch_size or any(
+            len(buffer) >= self.batch_size for buffer in self.buffers.values()
+        ):
+            self.flush()
+
+    def flush(self):
+        failed = False
+        for buffer in self.buffers.values():
+            if failed and buffer.table == "load_item":
+                # some rows of these items were not written, they are loaded
+                # again next time
+                buffer.rows.clear()
+                continue
+
+            try:
+                buffer.flush()
+            except Exception as e:
+                failed = True
+                self.log_error(buffer.error_code, buffer.table, "INSERT", e)
+
+        self.checkpoints.save()
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+        self.units = 0
+
+    def rollback(self):
+        if self.savepoint:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT unit")
+
+        self.in_unit = False
+        self.savepoint = False
+
+        self.keys.rollback()
+        for buffer in self.buffers.values():
+            buffer.rollback()
+
+    def log_error(self, code, entity, attribute, message, count=1):
+        # `count` > 1 stands for an aggregated record covering that many errors
+        logger.error(
+            f"{entity} ({attribute}): {code} {message}",
+            extra=error_fields(code, entity, attribute, message),
+        )
+        self.rollback()
+
+        if code not in self.error_counts:
+            self.error_counts[code] = 0
+
+        self.error_counts[code] += count
+
+    def write_rows(self, buffer, rows):
+        # rows outside of any unit of work, written after the rows the buffer
+        # holds already, in chunks of one multi-row INSERT
+        rows, buffer.rows = buffer.rows + list(rows), []
+        for i in range(0, len(rows), self.batch_size):
+            buffer.rows = rows[i : i + self.batch_size]
+            try:
+                buffer.flush()
+            except Exception as e:
+                self.log_error(buffer.error_code, buffer.table, "INSERT", e)
+
+    def remember(self, checkpoint, key):
+        # only called for items that were written; the digest is flushed after
+        # their rows, so an item that fails is retried next time
+        if checkpoint.digests is not None:
+            self.buffers["load_item"].add(
+                checkpoint.source, key, checkpoint.digests[key]
+            )
+
+    def load(self, streaming=False, workers=None):
+        self.keys.warm()
+        self.checkpoints.warm()
+
+        shops = {
+            path: self.checkpoints.start(os.path.basename(path), file_hash(path))
+            for path in (f"{self.DATA_PATH}/{source}" for source in self.SHOP_FILES)
+        }
+        recommendations = self.checkpoints.start("recommendations", file_hash(*shops))
+        if not all(c.done for c in [*shops.values(), recommendations]):
+            self.load_shops(shops, recommendations, streaming, workers)
+
+        # Categories
+        path = f"{self.DATA_PATH}/categories.xml"
+        checkpoint = self.checkpoints.start("categories.xml", file_hash(path))
+        if not checkpoint.done:
+            with self.metrics.stage("categories"):
+                start = time.perf_counter()
+                with self.metrics.stage("parse"):
+                    root = ET.parse(path).getroot()
+
+                self.create_categories(checkpoint, root, start)
+
+        # Reviews
+        with self.metrics.stage("reviews"):
+            self.create_reviews(f"{self.DATA_PATH}/reviews.csv")
+
+        self.finish()
+
+    def finish(self):
+        # everything after the last source: ratings, summaries and the
+        # generation are computed over the committed rows of all sources
+        self.flush()
+
+        if self.deferred_ratings:
+            with self.metrics.stage("ratings"):
+                # an incremental load only recomputes products with changed reviews
+                incremental = self.checkpoints.mode == "incremental"
+                self.update_ratings(self.rated if incremental else None)
+
+        with self.metrics.stage("summaries"):
+            self.summaries.refresh(full=self.checkpoints.mode != "incremental")
+            self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+        self.bump_generation()
+
+        for code, count in self.error_counts.items():
+            logger.error(f"Error {code}: {count}")
+
+        self.close()
+
+    def close(self):
+        for _, cursor in (self.prepared or {}).values():
+            cursor.close()
+        self.cursor.close()
+        self.conn.close()
+
+    def bump_generation(self):
+        # invalidates the cached results of reports.py
+        sql = self.backend.insert("load_generation", ("id", "generation"))
+        self.cursor.execute(sql, (1, 0))
+        self.cursor.execute(
+            "UPDATE load_generation SET generation = generation + 1 WHERE id = 1"
+        )
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+    def update_ratings(self, product_ids=None):
+        # one grouped pass over review instead of an AVG per inserted row
+        sql = self.backend.update_ratings()
+        if product_ids is None:
+            self.cursor.execute(sql.format(""))
+        else:
+            product_ids = list(product_ids)
+            for i in range(0, len(product_ids), self.batch_size):
+                chunk = product_ids[i : i + self.batch_size]
+                where = f"WHERE `product_id` IN ({', '.join(['%s'] * len(chunk))})"
+                self.cursor.execute(sql.format(where), chunk)
+
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+    def load_shops(self, shops, recommendations_checkpoint, streaming, workers):
+        timed = self.metrics.timed
+        if streaming or workers:
+            # Leipzig, Dresden - one pass per file, recommendations collected on the way
+            recommendations = []
+            for path, checkpoint in shops.items():
+                with self.metrics.stage("shops"):
+                    if workers:
+                        # parsing and validation both happen in the workers
+                        shop, records = parse_shop_parallel(path, workers)
+                        records = timed("parse", records)
+                    else:
+                        items = timed("parse", iter_shop(path))
+                        shop, records = next(items), timed("validate", parse_records(items))
+
+                    recommendations += self.create_shop(checkpoint, shop, records)
+        else:
+            # Leipzig, Dresden
+            for path, checkpoint in shops.items():
+                with self.metrics.stage("shops"):
+                    with self.metrics.stage("parse"):
+                        root = ET.parse(path).getroot()
+
+                    self.create_shop(checkpoint, root, timed("validate", parse_records(root)))
+
+            recommendations = (
+                (item.get("asin"), similar_asins(item))
+                for path in shops
+                for item in timed("parse", ET.parse(path).getroot())
+            )
+
+        with self.metrics.stage("recommendations"):
+            self.create_all_recommendations(recommendations_checkpoint, recommendations)
+
+    def create_reviews(self, path):
+        if self.set_based:
+            self.load_reviews(path)
+        else:
+            self.parse_reviews(path)
+
+    def parse_reviews(self, path):
+        checkpoint = self.checkpoints.start(os.path.basename(path), file_hash(path))
+        if checkpoint.done:
+            return
+
+        start, index = time.perf_counter(), -1
+        with open(path) as f:
+            reader = csv.DictReader(f)
+            for index, row in enumerate(self.metrics.timed("parse", reader)):
+                if checkpoint.skip(index):
+                    continue
+
+                try:
+                    review = parse_review(row)
+                except ValidationError as e:
+                    self.log_error(*e.args)
+                    continue
+
+                asin = review["asin"]
+                customer_name = review["customer"]
+                key = f"{asin}:{customer_name}"
+                if checkpoint.unchanged(key, review):
+                    continue
+
+                if (product_id := self.keys.product.get(asin)) is None:
+                    self.log_error(6, asin, "product", "Missing reviewed product")
+                    continue
+
+                self.begin()
+                if (customer_id := self.keys.customer.get(customer_name)) is None:
+                    try:
+                        sql = "INSERT INTO customer (name) VALUES (%s)"
+                        val = (customer_name,)
+                        self.execute(sql, val)
+                    except Exception as e:
+                        self.log_error(7, customer_name, "INSERT Customer", e)
+                        continue
+
+                    customer_id = self.statements.lastrowid
+                    self.keys.customer.add(customer_name, customer_id)
+
+                self.buffers["review"].add(
+                    customer_id,
+                    product_id,
+                    review["rating"],
+                    review["summary"],
+                    review["content"],
+                )
+                self.rated.add(product_id)
+                self.summaries.touch("customer_review_summary", customer_id)
+                self.remember(checkpoint, key)
+                checkpoint.position = index + 1
+                self.commit()
+
+        self.metrics.source(checkpoint.source, index + 1, time.perf_counter() - start)
+        checkpoint.complete()
+
+    def load_reviews(self, path):
+        # one transaction per chunk: products and customers resolved with one
+        # query each, new customers and reviews written as multi-row INSERTs
+        checkpoint = self.checkpoints.start(os.path.basename(path), file_hash(path))
+        if checkpoint.done:
+            return
+
+        start, rows = time.perf_counter(), 0
+        chunks = read_review_chunks(path, self.batch_size)
+        for first, reviews, errors in self.metrics.timed("parse", chunks):
+            rows = first + len(reviews) + len(errors)
+            if checkpoint.skip(rows - 1):
+                continue
+
+            for index, error in errors:
+                if not checkpoint.skip(first + index):
+                    self.log_error(*error)
+
+            reviews = [
+                (first + index, review)
+                for index, review in reviews
+                if not checkpoint.skip(first + index)
+                and not checkpoint.unchanged(
+                    f"{review['asin']}:{review['customer']}", review
+                )
+            ]
+
+            products = self.keys.product.get_many(r["asin"] for _, r in reviews)
+            for _, review in reviews:
+                if review["asin"] not in products:
+                    self.log_error(6, review["asin"], "product", "Missing reviewed product")
+            reviews = [(i, r) for i, r in reviews if r["asin"] in products]
+
+            customers = self.add_customers({r["customer"] for _, r in reviews})
+            for _, review in reviews:
+                if (customer_id := customers.get(review["customer"])) is None:
+                    continue
+
+                product_id = products[review["asin"]]
+                self.buffers["review"].add(
+                    customer_id,
+                    product_id,
+                    review["rating"],
+                    review["summary"],
+                    review["content"],
+                )
+                self.rated.add(product_id)
+                self.summaries.touch("customer_review_summary", customer_id)
+                self.remember(checkpoint, f"{review['asin']}:{review['customer']}")
+
+            for buffer in self.buffers.values():
+                buffer.commit()
+            checkpoint.position = rows
+            self.flush()
+
+        self.metrics.source(checkpoint.source, rows, time.perf_counter() - start)
+        checkpoint.complete()
+
+    def add_customers(self, names):
+        # ids of all `names`, see add_names
+        return self.add_names(
+            self.keys.customer, names, lambda name: 7, "INSERT Customer"
+        )
+
+    def create_categories(self, checkpoint, root, start):
+        # `start` is when reading the file began
+        if self.set_based:
+            self.load_categories(root)
+        else:
+            self.parse_categories(root)
+
+        self.metrics.source(
+            checkpoint.source,
+            sum(1 for _ in root.iter()) - 1,
+            time.perf_counter() - start,
+        )
+        checkpoint.complete()
+
+    def add_persons(self, persons):
+        # the persons of both shops are looked up once per name; a failed
+        # INSERT is logged with the error code of the role the name was first
+        # seen with
+        roles = {}
+        for person in persons:
+            roles.setdefault(person.name, person.role)
+
+        self.add_names(
+            self.keys.person,
+            roles,
+            lambda name: PERSON_ERRORS[roles[name]],
+            "INSERT Person",
+        )
+
+    def add_names(self, cache, names, error_code, attribute):
+        # ids of all `names`, the missing rows inserted with one statement;
+        # if that fails they are inserted one by one, so a bad name only
+        # drops itself
+        ids = cache.get_many(names)
+        new = {}
+        for name in names:
+            if name not in ids:
+                # names the collation compares as equal are one row
+                new.setdefault(cache.normal(name), name)
+        if not (new := sorted(new.values())):
+            return ids
+
+        sql = f"INSERT INTO {cache.table} (name) VALUES (%s)"
+        self.cursor.execute("SAVEPOINT names")
+        try:
+            self.cursor.executemany(sql, [(name,) for name in new])
+        except Exception:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT names")
+            written = []
+            for name in new:
+                try:
+                    self.cursor.execute(sql, (name,))
+                except Exception as e:
+                    self.log_error(error_code(name), name, attribute, e)
+                    continue
+                written.append(name)
+
+            if not (new := written):
+                return ids
+
+        placeholders = ", ".join(["%s"] * len(new))
+        sql = f"SELECT name, id FROM {cache.table} WHERE name IN ({placeholders})"
+        self.cursor.execute(sql, new)
+        for name, id in self.cursor.fetchall():
+            cache.store(name, id)
+
+        return cache.get_many(names)
+
+    def add_closure(self, ancestors, category_id):
+        # one row per ancestor of the category and one for itself at depth 0
+        path = (*ancestors, category_id)
+        for depth, ancestor_id in enumerate(reversed(path)):
+            self.buffers["category_closure"].add(ancestor_id, category_id, depth)
+
+        return path
+
+    def parse_categories(self, root, parent_id=None, ancestors=()):
+        for item in root:
+            if item.tag == "category":
+                name = item.text.strip()
+                if not name:
+                    self.log_error(9, "Category", "name", "Missing name")
+                    continue
+
+                if (category_id := self.keys.category.get((name, parent_id))) is None:
+                    self.begin()
+                    try:
+                        sql = "INSERT INTO category (name, parent_id) VALUES (%s, %s)"
+                        val = (name, parent_id)
+                        self.execute(sql, val)
+                    except Exception as e:
+                        self.log_error(10, name, "INSERT Category", e)
+                        continue
+
+                    category_id = self.statements.lastrowid
+                    self.keys.category.add((name, parent_id), category_id)
+
+                path = self.add_closure(ancestors, category_id)
+                self.commit()
+                self.parse_categories(item, category_id, path)
+
+            elif item.tag == "item":
+                asin = item.text
+                if not asin:
+                    self.log_error(11, "CategoryItem", "asin", "Missing ASIN")
+                    continue
+
+                if (product_id := self.keys.product.get(asin)) is None:
+                    self.log_error(12, asin, "product", "Missing product")
+                    continue
+
+                self.buffers["product_category"].add(product_id, parent_id)
+                self.commit()
+
+    def load_categories(self, root):
+        # the whole tree in one pass: ids of new categories are assigned here
+        # and every table is written with multi-row inserts
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM category")
+        next_id = self.cursor.fetchone()[0]
+        categories = WriteBuffer(
+            self.cursor, "category", ("id", "name", "parent_id"), 10, backend=self.backend
+        )
+        links = self.buffers["product_category"]
+        closure = self.buffers["category_closure"]
+
+        nodes = [(root, None, ())]
+        while nodes:
+            node, parent_id, ancestors = nodes.pop()
+            for item in node:
+                if item.tag == "category":
+                    name = (item.text or "").strip()
+                    if not name:
+                        self.log_error(9, "Category", "name", "Missing name")
+                        continue
+
+                    key = (name, parent_id)
+                    if (category_id := self.keys.category.get(key)) is None:
+                        next_id += 1
+                        category_id = next_id
+                        self.keys.category.store(key, category_id)
+                        categories.add(category_id, name, parent_id)
+
+                    path = self.add_closure(ancestors, category_id)
+                    categories.commit()
+                    closure.commit()
+                    nodes.append((item, category_id, path))
+
+                elif item.tag == "item":
+                    asin = item.text
+                    if not asin:
+                        self.log_error(11, "CategoryItem", "asin", "Missing ASIN")
+                        continue
+
+                    if (product_id := self.keys.product.get(asin)) is None:
+                        self.log_error(12, asin, "product", "Missing product")
+                        continue
+
+                    links.add(product_id, parent_id)
+                    links.commit()
+
+        # parents are written before their children, the closure after both
+        for buffer in (categories, closure, links):
+            self.write_rows(buffer, [])
+
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+    def create_item(self, item, branch_id):
+        # returns whether the item was written
+        asin = item.asin
+
+        self.begin()
+        if (product_id := self.keys.product.get(asin)) is None:
+            try:
+                sql = "INSERT INTO `product` (`asin`, `name`, `image`, `rank`) VALUES (%s, %s, %s, %s)"
+                val = (asin, item.name, item.image, item.rank)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(17, asin, "INSERT", e)
+                return False
+
+            product_id = self.statements.lastrowid
+            self.keys.product.add(asin, product_id)
+        elif self.checkpoints.mode == "incremental":
+            try:
+                sql = "UPDATE `product` SET `name` = %s, `image` = %s, `rank` = %s WHERE `id` = %s"
+                val = (item.name, item.image, item.rank, product_id)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(17, asin, "UPDATE", e)
+                return False
+
+        if isinstance(cd := item.spec, CdSpec):
+            try:
+                sql = self.sql["cd"]
+                val = (product_id, cd.label, cd.date_published)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(20, asin, "INSERT CD", e)
+                return False
+
+            # tracks only come with a new cd
+            if self.statements.rowcount == 1:
+                try:
+                    sql = "INSERT INTO track (cd_id, title) VALUES (%s, %s)"
+                    val = [(product_id, t) for t in cd.tracks]
+                    self.execute(sql, val, many=True)
+                except Exception as e:
+                    self.log_error(21, asin, "INSERT Tracks", e)
+                    return False
+
+                self.summaries.touch("cd_track_summary", product_id)
+
+        elif isinstance(dvd := item.spec, DvdSpec):
+            try:
+                sql = self.sql["dvd"]
+                val = (product_id, dvd.format, dvd.duration, dvd.region_code)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(27, asin, "INSERT DVD", e)
+                return False
+
+        elif isinstance(book := item.spec, BookSpec):
+            publisher = book.publisher
+            if (publisher_id := self.keys.publisher.get(publisher)) is None:
+                try:
+                    sql = "INSERT INTO publisher (name) VALUES (%s)"
+                    val = (publisher,)
+                    self.execute(sql, val)
+                except Exception as e:
+                    self.log_error(34, publisher, "INSERT Publisher", e)
+                    return False
+
+                publisher_id = self.statements.lastrowid
+                self.keys.publisher.add(publisher, publisher_id)
+
+            try:
+                sql = self.sql["book"]
+                val = (
+                    product_id,
+                    book.isbn,
+                    book.n_pages,
+                    book.date_published,
+                    publisher_id,
+                )
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(35, asin, "INSERT Book", e)
+                return False
+
+        # the persons were written by add_persons; a missing one failed there
+        for person in item.persons:
+            if (person_id := self.keys.person.get(person.name)) is not None:
+                self.buffers["person_product"].add(person_id, product_id, person.role)
+
+        # sale info
+        offer = item.offer
+        self.buffers["branch_product"].add(
+            product_id, branch_id, offer.price, offer.state, offer.stock
+        )
+        self.summaries.touch("product_price_summary", product_id)
+        return True
+
+    def create_branch(self, root):
+        try:
+            name, street, zipcode = parse_shop(root)
+        except ValidationError as e:
+            self.log_error(*e.args)
+            return None
+
+        self.begin()
+        sql = "SELECT id FROM branch WHERE name = %s"
+        val = (name,)
+        self.cursor.execute(sql, val)
+        if (branch_id := self.cursor.fetchone()) is None:
+            try:
+                sql = "INSERT INTO address (street, zip) VALUES (%s, %s)"
+                val = (street, zipcode)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(41, name, "INSERT Address", e)
+                return None
+
+            address_id = self.statements.lastrowid
+
+            try:
+                sql = "INSERT INTO branch (name, address_id) VALUES (%s, %s)"
+                val = (name, address_id)
+                self.execute(sql, val)
+            except Exception as e:
+                self.log_error(42, name, "INSERT Branch", e)
+                return None
+
+            branch_id = self.statements.lastrowid
+        else:
+            branch_id = branch_id[0]
+
+        self.commit()
+        return branch_id
+
+    def create_shop(self, checkpoint, shop, records):
+        # records are (asin, similars, item, error) in file order; returns the
+        # recommendation edges of all items
+        start = time.perf_counter()
+        branch_id = self.create_branch(shop)
+        recommendations = self.create_records(checkpoint, branch_id, records)
+        self.metrics.source(
+            checkpoint.source, len(recommendations), time.perf_counter() - start
+        )
+        checkpoint.complete()
+        return recommendations
+
+    def create_records(self, checkpoint, branch_id, records, first=0):
+        # `first` is the position of the first record in the shop file; the
+        # contributors of every batch_size records are written up front
+        recommendations = []
+        records = iter(records)
+        while chunk := list(islice(records, self.batch_size)):
+            if branch_id is not None:
+                self.add_persons(
+                    person
+                    for index, (_, _, item, _) in enumerate(chunk, first)
+                    if item is not None and not checkpoint.skip(index)
+                    for person in item.persons
+                )
+
+            recommendations += self.create_chunk(checkpoint, branch_id, chunk, first)
+            first += len(chunk)
+
+        return recommendations
+
+    def create_chunk(self, checkpoint, branch_id, records, first):
+        recommendations = []
+        for index, (asin, similars, item, error) in enumerate(records, first):
+            recommendations.append((asin, similars))
+            if branch_id is None or checkpoint.skip(index):
+                continue
+
+            if error:
+                self.log_error(*error)
+                continue
+
+            if checkpoint.unchanged(asin, item):
+                continue
+
+            if self.create_item(item, branch_id):
+                self.remember(checkpoint, asin)
+                checkpoint.position = index + 1
+            self.commit()
+
+        return recommendations
+
+    def create_all_recommendations(self, checkpoint, recommendations):
+        if checkpoint.done:
+            return
+
+        if self.set_based:
+            self.load_recommendations(recommendations)
+        else:
+            for asin, similars in recommendations:
+                self.create_recommendations(asin, similars)
+
+        checkpoint.complete()
+
+    def load_recommendations(self, recommendations):
+        # all edges of both shops resolved against the product keys at once,
+        # unresolved ASINs are reported as one record per error code
+        records, asins, missing_asin = [], set(), 0
+        for asin, similars in recommendations:
+            if not asin:
+                missing_asin += 1
+                continue
+
+            records.append((asin, similars))
+            asins.add(asin)
+            asins.update(similar for similar in similars if similar)
+
+        ids = self.keys.product.get_many(asins)
+        rows, unknown, unknown_similar, missing_similar = set(), Counter(), Counter(), 0
+        for asin, similars in records:
+            if (product_id := ids.get(asin)) is None:
+                unknown[asin] += 1
+                continue
+
+            for similar in similars:
+                if not similar:
+                    missing_similar += 1
+                elif (rec_id := ids.get(similar)) is None:
+                    unknown_similar[similar] += 1
+                else:
+                    rows.add((product_id, rec_id))
+
+        for code, errors, message in [
+            (43, Counter({"": missing_asin}), "records without an ASIN"),
+            (44, unknown, "ASINs not found"),
+            (45, Counter({"": missing_similar}), "recommendations without an ASIN"),
+            (46, unknown_similar, "recommendation ASINs not found"),
+        ]:
+            if count := sum(errors.values()):
+                asins = ", ".join(a for a in errors if a)
+                self.log_error(
+                    code,
+                    "Recommendation",
+                    "asin",
+                    f"{count} {message}" + (f": {asins}" if asins else ""),
+                    count,
+                )
+
+        self.write_rows(self.buffers["recommendation"], sorted(rows))
+        self.metrics.call("commit", "COMMIT", self.conn.commit)
+
+    def create_recommendations(self, asin, similars):
+        if not asin:
+            self.log_error(43, asin, "asin", "Missing asin")
+            return
+
+        if (product_id := self.keys.product.get(asin)) is None:
+            self.log_error(44, asin, "asin", "ASIN not found")
+            return
+
+        for asin in similars:
+            if not asin:
+                self.log_error(45, asin, "asin", "Missing asin in recommendation")
+                continue
+
+            if (rec_id := self.keys.product.get(asin)) is None:
+                self.log_error(46, asin, "asin", "Recommendation ASIN not found")
+                continue
+
+            self.buffers["recommendation"].add(product_id, rec_id)
+            self.commit()
+
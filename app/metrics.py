@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+import cProfile
+import json
+import time
+
+
+class Metrics:
+    """Wall/CPU time per stage, round trips per SQL template and throughput
+    per source file.
+
+    Stages nest; each stage is charged only for the time not spent in the
+    stages it encloses, so the stage totals add up to the run time.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.statements = {}
+        self.sources = {}
+        self.active = []
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        # time spent in enclosed stages, subtracted on exit
+        self.active.append([0.0, 0.0])
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            nested_wall, nested_cpu = self.active.pop()
+            if self.active:
+                self.active[-1][0] += wall
+                self.active[-1][1] += cpu
+
+            stats = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            stats["calls"] += 1
+            stats["wall"] += wall - nested_wall
+            stats["cpu"] += cpu - nested_cpu
+
+    def timed(self, name, iterable):
+        # charges the time to produce each element to `name`
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    value = next(iterator)
+                except StopIteration:
+                    return
+            yield value
+
+    def statement(self, sql, rows, wall):
+        template = " ".join(sql.split())
+        stats = self.statements.setdefault(
+            template, {"round_trips": 0, "rows": 0, "wall": 0.0}
+        )
+        stats["round_trips"] += 1
+        stats["rows"] += max(rows, 0)
+        stats["wall"] += wall
+
+    def call(self, stage, template, fn):
+        # round trips that do not go through a cursor, like COMMIT
+        with self.stage(stage):
+            start = time.perf_counter()
+            fn()
+            self.statement(template, 0, time.perf_counter() - start)
+
+    def source(self, name, items, wall):
+        stats = self.sources.setdefault(name, {"items": 0, "wall": 0.0})
+        stats["items"] += items
+        stats["wall"] += wall
+
+    def merge(self, other):
+        # adds the totals of metrics collected in another thread; stages that
+        # ran concurrently can add up to more than the run time
+        for totals, stats in [
+            (self.stages, other.stages),
+            (self.statements, other.statements),
+            (self.sources, other.sources),
+        ]:
+            for name, values in stats.items():
+                target = totals.setdefault(name, dict.fromkeys(values, 0))
+                for key, value in values.items():
+                    target[key] += value
+
+    def report(self, **extra):
+        return {
+            "stages": self.stages,
+            "statements": dict(
+                sorted(
+                    self.statements.items(),
+                    key=lambda s: s[1]["round_trips"],
+                    reverse=True,
+                )
+            ),
+            "round_trips": sum(s["round_trips"] for s in self.statements.values()),
+            "sources": {
+                name: {**stats, "items_per_sec": stats["items"] / stats["wall"]}
+                for name, stats in self.sources.items()
+                if stats["wall"]
+            },
+            **extra,
+        }
+
+    def write(self, path, **extra):
+        with open(path, "w") as f:
+            json.dump(self.report(**extra), f, indent=2)
+
+
+class InstrumentedCursor:
+    """Cursor proxy that records every statement in `metrics`."""
+
+    STAGES = {"SELECT": "select", "INSERT": "insert", "UPDATE": "update"}
+
+    def __init__(self, cursor, metrics):
+        self.cursor = cursor
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def run(self, method, sql, params):
+        stage = self.STAGES.get(sql.split(None, 1)[0].upper(), "sql")
+        with self.metrics.stage(stage):
+            start = time.perf_counter()
+            result = method(sql, params)
+            self.metrics.statement(
+                sql, self.cursor.rowcount, time.perf_counter() - start
+            )
+
+        return result
+
+    def execute(self, sql, params=()):
+        return self.run(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self.run(self.cursor.executemany, sql, params)
+
+
+@contextmanager
+def profiled(path):
+    # cProfile around the block, stats dumped for pstats/snakeviz
+    if not path:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
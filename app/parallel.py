@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import islice
+import mmap
+import os
+from queue import Queue
+import re
+from threading import Thread
+import xml.etree.ElementTree as ET
+
+from parsing import parse_records, parse_review_chunk
+
+SHOP_TAG = re.compile(rb"<shop\b[^>]*>")
+ITEM_TAG = re.compile(rb"<item\b[^>]*>|</item>")
+
+
+def split_shop(data, chunk_size):
+    # cuts the raw shop file into chunks of `chunk_size` top-level items; every
+    # chunk is returned as a complete document with the original prolog
+    shop = SHOP_TAG.search(data)
+    header = data[: shop.end()]
+    yield header + b"</shop>"
+
+    start, depth, count = shop.end(), 0, 0
+    for tag in ITEM_TAG.finditer(data, shop.end()):
+        if tag.group().startswith(b"</"):
+            depth -= 1
+        elif not tag.group().endswith(b"/>"):
+            depth += 1
+
+        if depth == 0:
+            count += 1
+            if count == chunk_size:
+                yield header + data[start : tag.end()] + b"</shop>"
+                start, count = tag.end(), 0
+
+    if count:
+        yield header + data[start : tag.end()] + b"</shop>"
+
+
+def parse_chunk(document):
+    return list(parse_records(ET.fromstring(document)))
+
+
+def parse_shop_parallel(path, workers=None, chunk_size=500):
+    """Returns the <shop> element and an iterator over (asin, similars, item,
+    error) for every item, in file order.
+
+    Chunks are parsed and validated in a process pool. At most two chunks per
+    worker are in flight, so a slow writer holds the parsers back instead of
+    letting results pile up.
+    """
+    workers = workers or os.cpu_count()
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    chunks = split_shop(data, chunk_size)
+    shop = ET.fromstring(next(chunks))
+
+    def results():
+        queue = Queue(maxsize=2 * workers)
+
+        def produce(pool):
+            try:
+                for chunk in chunks:
+                    queue.put(pool.submit(parse_chunk, chunk))
+            finally:
+                queue.put(None)
+
+        with ProcessPoolExecutor(workers) as pool:
+            Thread(target=produce, args=(pool,), daemon=True).start()
+            while (future := queue.get()) is not None:
+                yield from future.result()
+
+        data.close()
+
+    return shop, results()
+
+
+def read_review_chunks(path, chunk_size=1000, prefetch=2):
+    """Yields (first row index, valid reviews, errors) per chunk of
+    `chunk_size` rows of a review CSV, see parse_review_chunk.
+
+    A reader thread parses and validates up to `prefetch` chunks ahead, so
+    it works while the consumer waits for the database.
+    """
+    queue = Queue(maxsize=prefetch)
+
+    def produce():
+        try:
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                start = 0
+                while rows := list(islice(reader, chunk_size)):
+                    # short rows get empty fields, like csv.DictReader
+                    rows = [row + [""] * (len(header) - len(row)) for row in rows]
+                    queue.put((start, *parse_review_chunk(header, rows)))
+                    start += len(rows)
+        except Exception as e:
+            queue.put(e)
+        finally:
+            queue.put(None)
+
+    Thread(target=produce, daemon=True).start()
+    while (chunk := queue.get()) is not None:
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
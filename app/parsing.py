@@ -0,0 +1,257 @@
+from datetime import datetime
+import xml.etree.ElementTree as ET
+
+from records import BookSpec, CdSpec, DvdSpec, Offer, PersonRole, Product
+
+
+class ValidationError(Exception):
+    def __init__(self, code, entity, attribute, message):
+        super().__init__(code, entity, attribute, message)
+
+
+def iter_shop(path):
+    # yields the <shop> element first, then every top-level <item>; an item is
+    # cleared as soon as the consumer asks for the next one
+    shop = None
+    depth = 0
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if depth == 0:
+                shop = elem
+                yield shop
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            yield elem
+            shop.clear()
+
+
+def similar_asins(item):
+    # Leipzig nests <asin> in each similar product, Dresden puts it in an attribute
+    similars = item.find("similars")
+    if similars is None:
+        return []
+
+    return [
+        x.text if (x := s.find("asin")) is not None else s.get("asin")
+        for s in similars
+    ]
+
+
+def parse_shop(root):
+    name = root.get("name")
+    street = root.get("street")
+    zipcode = root.get("zip")
+
+    if not name or not street or not zipcode:
+        raise ValidationError(40, name, "name", "Missing name, street, or zipcode")
+
+    return name, street, zipcode
+
+
+def parse_item(root):
+    # product info
+    asin = root.get("asin")
+    if not asin:
+        raise ValidationError(14, "Unknown", "asin", "Missing ASIN")
+
+    pgroup = root.get("pgroup")
+    if pgroup not in ["Music", "DVD", "Book"]:
+        raise ValidationError(15, asin, "pgroup", "Unknown product group")
+
+    name = x.text if (x := root.find("title")) is not None else None
+    if not name:
+        raise ValidationError(16, asin, "name", "Missing name")
+
+    if pgroup == "Music":
+        label = ""
+        for x in root.find("labels"):
+            l = x.get("name")
+            if l and len(label) < len(l):
+                label = l
+        if not label:
+            raise ValidationError(18, asin, "label", "Missing label")
+
+        date_published = (
+            datetime.strptime(x, "%Y-%m-%d").date()
+            if (x := root.find("musicspec").find("releasedate").text)
+            else None
+        )
+        if date_published is None:
+            raise ValidationError(19, asin, "date_published", "Missing date published")
+
+        spec = CdSpec(
+            label, date_published, [track.text for track in root.find("tracks")]
+        )
+        persons = [
+            PersonRole(n, "ARTIST") for a in root.find("artists") if (n := a.get("name"))
+        ]
+
+    elif pgroup == "DVD":
+        dvd_data = root.find("dvdspec")
+        format = dvd_data.find("format").text
+        if not format:
+            raise ValidationError(24, asin, "format", "Unknown format")
+
+        duration = int(x) if (x := dvd_data.find("runningtime").text) else None
+        if duration is None:
+            raise ValidationError(25, asin, "duration", "Missing duration")
+
+        region_code = dvd_data.find("regioncode").text
+        if not region_code:
+            raise ValidationError(26, asin, "region_code", "Missing region code")
+
+        spec = DvdSpec(format, duration, region_code)
+        persons = [
+            PersonRole(n, r)
+            for p, r in [
+                ("actors", "ACTOR"),
+                ("creators", "CREATOR"),
+                ("directors", "DIRECTOR"),
+            ]
+            for x in root.find(p)
+            if (n := x.get("name"))
+        ]
+
+    elif pgroup == "Book":
+        book_data = root.find("bookspec")
+        isbn = book_data.find("isbn").get("val")
+        if not isbn:
+            raise ValidationError(30, asin, "isbn", "Missing ISBN")
+
+        n_pages = int(x) if (x := book_data.find("pages").text) else None
+        if n_pages is None:
+            raise ValidationError(31, asin, "n_pages", "Missing number of pages")
+
+        date_published = (
+            datetime.strptime(x, "%Y-%m-%d").date()
+            if (x := book_data.find("publication").get("date"))
+            else None
+        )
+        if date_published is None:
+            raise ValidationError(32, asin, "date_published", "Missing date published")
+
+        publisher = [n for p in root.find("publishers") if (n := p.get("name"))]
+        publisher = publisher[0] if publisher else None
+        if not publisher:
+            raise ValidationError(33, asin, "publisher", "Missing publisher")
+
+        spec = BookSpec(isbn, n_pages, date_published, publisher)
+        persons = [
+            PersonRole(n, "AUTHOR") for a in root.find("authors") if (n := a.get("name"))
+        ]
+
+    # sale info
+    price_data = root.find("price")
+    price = float(x) if (x := price_data.text) else None
+
+    state = price_data.get("state").upper()
+    if state not in ["NEW", "USED"]:
+        raise ValidationError(38, asin, "state", "Invalid state")
+
+    return Product(
+        asin,
+        pgroup,
+        name,
+        root.get("picture"),
+        int(x) if (x := root.get("salesrank")) else None,
+        spec,
+        persons,
+        Offer(price, state, bool(price)),
+    )
+
+
+def parse_records(items):
+    # the per-item result every shop consumer works with, the recommendation
+    # edges are kept even for items that fail validation
+    for elem in items:
+        try:
+            item, error = parse_item(elem), None
+        except ValidationError as e:
+            item, error = None, e.args
+
+        yield elem.get("asin"), similar_asins(elem), item, error
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parse_review(row):
+    asin = row["product"]
+    if not asin:
+        raise ValidationError(1, "Review", "asin", "Missing ASIN")
+
+    rating = to_int(x) if (x := row["rating"]) else None
+    if not rating or rating < 1 or rating > 5:
+        raise ValidationError(2, asin, "rating", "Missing rating")
+
+    customer_name = row["user"]
+    if not customer_name:
+        raise ValidationError(3, asin, "customer_name", "Missing customer name")
+
+    summary = row["summary"]
+    if not summary:
+        raise ValidationError(4, asin, "summary", "Missing summary")
+
+    content = row["content"]
+    if not content:
+        raise ValidationError(5, asin, "content", "Missing content")
+
+    return {
+        "asin": asin,
+        "rating": rating,
+        "customer": customer_name,
+        "summary": summary,
+        "content": content,
+    }
+
+
+def parse_review_chunk(header, rows):
+    """Validates a chunk of review rows column by column.
+
+    Returns (index, review) for the valid rows and (index, error args) for
+    the others, with the same checks and error precedence as parse_review.
+    """
+    columns = dict(zip(header, zip(*rows))) if rows else {}
+    asins = columns.get("product", ())
+    ratings = [to_int(x) if x else None for x in columns.get("rating", ())]
+    customers = columns.get("user", ())
+    summaries = columns.get("summary", ())
+    contents = columns.get("content", ())
+
+    checks = [
+        (1, "asin", "Missing ASIN", list(map(bool, asins))),
+        (2, "rating", "Missing rating", [bool(r) and 1 <= r <= 5 for r in ratings]),
+        (3, "customer_name", "Missing customer name", list(map(bool, customers))),
+        (4, "summary", "Missing summary", list(map(bool, summaries))),
+        (5, "content", "Missing content", list(map(bool, contents))),
+    ]
+    valid = [all(row) for row in zip(*(passed for *_, passed in checks))]
+
+    reviews, errors = [], []
+    for i, ok in enumerate(valid):
+        if ok:
+            reviews.append(
+                (
+                    i,
+                    {
+                        "asin": asins[i],
+                        "rating": ratings[i],
+                        "customer": customers[i],
+                        "summary": summaries[i],
+                        "content": contents[i],
+                    },
+                )
+            )
+            continue
+
+        code, attribute, message, _ = next(c for c in checks if not c[3][i])
+        errors.append((i, (code, asins[i] or "Review", attribute, message)))
+
+    return reviews, errors
@@ -0,0 +1,230 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from checkpoint import file_hash
+from loader import DataLoader
+from metrics import Metrics
+from parallel import parse_shop_parallel
+from parsing import iter_shop, parse_records
+
+
+class Writer:
+    """A DataLoader with a thread of its own. The loader is created on that
+    thread and every call that uses its connection runs there, so coroutines
+    await the round trips without blocking the event loop."""
+
+    def __init__(self, **loader_args):
+        self.loader_args = loader_args
+        self.executor = ThreadPoolExecutor(1)
+        self.loader = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.loader = await loop.run_in_executor(
+            self.executor, partial(DataLoader, **self.loader_args)
+        )
+        # counted per writer, the pipeline adds them up
+        self.loader.error_counts = {}
+
+    async def run(self, stage, fn, *args):
+        def call():
+            if stage is None:
+                return fn(*args)
+            with self.loader.metrics.stage(stage):
+                return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def close(self):
+        await self.run(None, self.loader.close)
+        self.executor.shutdown()
+
+
+class Pipeline:
+    """Loads all sources with asyncio, so parsing and database round trips
+    overlap.
+
+    Parsers run in threads (or the processes of parse_shop_parallel) and feed
+    bounded queues. One writer creates the products and offers, shop after
+    shop; once they are committed, recommendations, categories and reviews
+    are written concurrently by a writer each, on connections of their own.
+    Ratings, summaries and the load generation come last.
+    """
+
+    def __init__(self, workers=None, queue_size=4, **loader_args):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = loader_args.get("batch_size", 1000)
+        self.loader_args = loader_args
+        self.metrics = Metrics()
+        self.error_counts = {}
+
+    def load(self):
+        asyncio.run(self.run())
+
+    async def parse_shop(self, path, queue):
+        # puts the <shop> element, then lists of up to batch_size records
+        metrics = Metrics()
+
+        def start():
+            if self.workers:
+                return parse_shop_parallel(path, self.workers)
+            items = iter_shop(path)
+            # iter_shop clears the <shop> element, the writer gets a copy
+            shop = next(items)
+            return ET.Element(shop.tag, shop.attrib), parse_records(items)
+
+        def take(records):
+            with metrics.stage("parse"):
+                return list(islice(records, self.batch_size))
+
+        shop, records = await asyncio.to_thread(start)
+        await queue.put(shop)
+        while records_batch := await asyncio.to_thread(take, records):
+            await queue.put(records_batch)
+
+        await queue.put(None)
+        self.metrics.merge(metrics)
+
+    async def parse_categories(self, path):
+        metrics = Metrics()
+
+        def parse():
+            with metrics.stage("parse"):
+                return ET.parse(path).getroot()
+
+        start = time.perf_counter()
+        root = await asyncio.to_thread(parse)
+        self.metrics.merge(metrics)
+        return start, root
+
+    async def write_shop(self, writer, checkpoint, queue):
+        loader = writer.loader
+        start = time.perf_counter()
+        branch_id = await writer.run("shops", loader.create_branch, await queue.get())
+
+        recommendations = []
+        while (records := await queue.get()) is not None:
+            recommendations += await writer.run(
+                "shops",
+                loader.create_records,
+                checkpoint,
+                branch_id,
+                records,
+                len(recommendations),
+            )
+
+        loader.metrics.source(
+            checkpoint.source, len(recommendations), time.perf_counter() - start
+        )
+        checkpoint.complete()
+        return recommendations
+
+    async def write_shops(self, writer, checkpoints, queues):
+        # one shop after the other, the items of both refer to the same products
+        recommendations = []
+        for path, checkpoint in checkpoints.items():
+            recommendations += await self.write_shop(writer, checkpoint, queues[path])
+        return recommendations
+
+    async def write_recommendations(self, writer, checkpoint, recommendations):
+        loader = writer.loader
+        await writer.run(None, loader.keys.product.warm)
+        await writer.run(
+            "recommendations",
+            loader.create_all_recommendations,
+            checkpoint,
+            recommendations,
+        )
+        await writer.run(None, loader.flush)
+
+    async def write_categories(self, writer, checkpoint, tree):
+        if checkpoint.done:
+            return
+
+        loader = writer.loader
+        await writer.run(None, loader.keys.product.warm)
+        await writer.run(None, loader.keys.category.warm)
+        start, root = await tree
+        await writer.run(
+            "categories", loader.create_categories, checkpoint, root, start
+        )
+        await writer.run(None, loader.flush)
+
+    async def write_reviews(self, writer):
+        loader = writer.loader
+        await writer.run(None, loader.keys.product.warm)
+        await writer.run(None, loader.keys.customer.warm)
+        await writer.run(
+            "reviews", loader.create_reviews, f"{loader.DATA_PATH}/reviews.csv"
+        )
+        await writer.run(None, loader.flush)
+
+    def merge(self, loader, other):
+        # what the final steps of `loader` need from another writer
+        loader.rated |= other.rated
+        for table, keys in other.summaries.touched.items():
+            loader.summaries.touched[table] |= keys
+        for code, count in other.error_counts.items():
+            loader.error_counts[code] = loader.error_counts.get(code, 0) + count
+        loader.metrics.merge(other.metrics)
+
+    async def run(self):
+        writers = [Writer(**self.loader_args) for _ in range(4)]
+        shops, recommendations, categories, reviews = writers
+        await asyncio.gather(*(writer.start() for writer in writers))
+        for writer in writers:
+            await writer.run(None, writer.loader.checkpoints.warm)
+
+        loader = shops.loader
+        paths = [f"{loader.DATA_PATH}/{source}" for source in loader.SHOP_FILES]
+        checkpoints = {
+            path: loader.checkpoints.start(
+                os.path.basename(path), await asyncio.to_thread(file_hash, path)
+            )
+            for path in paths
+        }
+        edges = recommendations.loader.checkpoints.start(
+            "recommendations", await asyncio.to_thread(file_hash, *paths)
+        )
+
+        # categories.xml is parsed while the shops are written
+        path = f"{loader.DATA_PATH}/categories.xml"
+        category_checkpoint = categories.loader.checkpoints.start(
+            "categories.xml", await asyncio.to_thread(file_hash, path)
+        )
+        tree = None
+        if not category_checkpoint.done:
+            tree = asyncio.create_task(self.parse_categories(path))
+
+        recommended = []
+        if not all(c.done for c in [*checkpoints.values(), edges]):
+            await shops.run(None, loader.keys.warm)
+            # both shops are parsed at once, a failing parser ends the load
+            queues = {path: asyncio.Queue(self.queue_size) for path in paths}
+            recommended, *_ = await asyncio.gather(
+                self.write_shops(shops, checkpoints, queues),
+                *(self.parse_shop(path, queue) for path, queue in queues.items()),
+            )
+
+        # the other tables refer to the products, which must be committed
+        await shops.run("shops", loader.flush)
+        await asyncio.gather(
+            self.write_recommendations(recommendations, edges, recommended),
+            self.write_categories(categories, category_checkpoint, tree),
+            self.write_reviews(reviews),
+        )
+
+        for writer in (recommendations, categories, reviews):
+            self.merge(loader, writer.loader)
+            await writer.close()
+
+        await shops.run(None, loader.finish)
+        shops.executor.shutdown()
+        self.metrics.merge(loader.metrics)
+        self.error_counts = loader.error_counts
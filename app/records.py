@@ -0,0 +1,76 @@
+# validated shop items as produced by parsing.parse_item; they keep no
+# reference to the XML, and their repr, which lists every field, is what
+# checkpoint.item_digest hashes
+
+
+class Record:
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+
+class PersonRole(Record):
+    __slots__ = ("name", "role")
+
+    def __init__(self, name, role):
+        self.name = name
+        self.role = role
+
+
+class CdSpec(Record):
+    __slots__ = ("label", "date_published", "tracks")
+
+    def __init__(self, label, date_published, tracks):
+        self.label = label
+        self.date_published = date_published
+        self.tracks = tracks
+
+
+class DvdSpec(Record):
+    __slots__ = ("format", "duration", "region_code")
+
+    def __init__(self, format, duration, region_code):
+        self.format = format
+        self.duration = duration
+        self.region_code = region_code
+
+
+class BookSpec(Record):
+    __slots__ = ("isbn", "n_pages", "date_published", "publisher")
+
+    def __init__(self, isbn, n_pages, date_published, publisher):
+        self.isbn = isbn
+        self.n_pages = n_pages
+        self.date_published = date_published
+        self.publisher = publisher
+
+
+class Offer(Record):
+    __slots__ = ("price", "state", "stock")
+
+    def __init__(self, price, state, stock):
+        self.price = price
+        self.state = state
+        self.stock = stock
+
+
+class Product(Record):
+    # `spec` is the CdSpec, DvdSpec or BookSpec of the product group
+    __slots__ = ("asin", "pgroup", "name", "image", "rank", "spec", "persons", "offer")
+
+    def __init__(self, asin, pgroup, name, image, rank, spec, persons, offer):
+        self.asin = asin
+        self.pgroup = pgroup
+        self.name = name
+        self.image = image
+        self.rank = rank
+        self.spec = spec
+        self.persons = persons
+        self.offer = offer
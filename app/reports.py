@@ -0,0 +1,220 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+from threading import Lock
+
+import db
+
+# one named report per query of select.sql, with the defaults of its
+# parameters; aggregates over offers, tracks and reviews read the summary
+# tables the loader maintains
+REPORTS = {
+    "products_per_type": (
+        """
+        SELECT 'book' AS type, COUNT(*) AS count FROM book
+        UNION ALL
+        SELECT 'music_cd' AS type, COUNT(*) AS count FROM cd
+        UNION ALL
+        SELECT 'dvd' AS type, COUNT(*) AS count FROM dvd
+        """,
+        {},
+    ),
+    "top_per_type": (
+        """
+        WITH products_with_ratings AS (
+            SELECT 'book' AS type, book.id AS product_id, product.rating AS rating
+            FROM book JOIN product ON book.id = product.id
+            UNION ALL
+            SELECT 'music_cd' AS type, cd.id AS product_id, product.rating AS rating
+            FROM cd JOIN product ON cd.id = product.id
+            UNION ALL
+            SELECT 'dvd' AS type, dvd.id AS product_id, product.rating AS rating
+            FROM dvd JOIN product ON dvd.id = product.id
+        )
+        SELECT * FROM (
+            SELECT type, product_id, rating,
+            ROW_NUMBER() OVER(PARTITION BY type ORDER BY rating DESC) AS rn
+            FROM products_with_ratings
+        ) t WHERE rn <= %(n)s
+        """,
+        {"n": 5},
+    ),
+    "products_without_offer": (
+        """
+        SELECT product.id AS product_id FROM product
+        LEFT JOIN branch_product ON product.id = branch_product.product_id
+        WHERE branch_product.product_id IS NULL
+        """,
+        {},
+    ),
+    "price_spread": (
+        """
+        SELECT product_id FROM product_price_summary
+        WHERE max_price > %(factor)s * min_price
+        """,
+        {"factor": 2},
+    ),
+    "polarizing_products": (
+        """
+        SELECT product_id FROM review WHERE rating = %(low)s
+        INTERSECT
+        SELECT product_id FROM review WHERE rating = %(high)s
+        """,
+        {"low": 1, "high": 5},
+    ),
+    "products_without_review": (
+        """
+        SELECT COUNT(*) AS count FROM product
+        LEFT JOIN review ON product.id = review.product_id
+        WHERE review.product_id IS NULL
+        """,
+        {},
+    ),
+    "frequent_reviewers": (
+        """
+        SELECT customer_id FROM customer_review_summary
+        WHERE review_count >= %(min_reviews)s
+        """,
+        {"min_reviews": 10},
+    ),
+    "multimedia_authors": (
+        """
+        SELECT DISTINCT person.name FROM person
+        JOIN person_product pp1 ON person.id = pp1.person_id
+        JOIN book ON pp1.product_id = book.id
+        WHERE EXISTS (
+            SELECT 1 FROM person_product pp2
+            JOIN cd ON pp2.product_id = cd.id
+            WHERE pp2.person_id = person.id
+        ) OR EXISTS (
+            SELECT 1 FROM person_product pp3
+            JOIN dvd ON pp3.product_id = dvd.id
+            WHERE pp3.person_id = person.id
+        )
+        ORDER BY person.name
+        """,
+        {},
+    ),
+    "average_tracks": (
+        """
+        SELECT AVG(track_count) AS average FROM cd_track_summary
+        """,
+        {},
+    ),
+    "similar_in_other_main_categories": (
+        """
+        SELECT product_id FROM product_category pc1
+        WHERE EXISTS (
+            SELECT 1 FROM product_category pc2
+            JOIN category_closure ON pc2.category_id = category_closure.descendant_id
+            JOIN category main_category ON category_closure.ancestor_id = main_category.id
+            AND main_category.parent_id IS NULL
+            WHERE pc1.product_id <> pc2.product_id AND pc1.category_id <> pc2.category_id
+        )
+        """,
+        {},
+    ),
+    "offered_everywhere": (
+        """
+        SELECT product_id FROM product_price_summary
+        WHERE branch_count = (SELECT COUNT(*) FROM branch)
+        """,
+        {},
+    ),
+    "cheapest_share": (
+        """
+        WITH cheapest_offers AS (
+            SELECT product_id, min_price FROM product_price_summary
+        ), branch_offers AS (
+            SELECT branch_product.product_id, branch_product.price FROM branch_product
+            JOIN branch ON branch_product.branch_id = branch.id
+            JOIN address ON branch.address_id = address.id
+            WHERE address.street LIKE %(street)s
+        )
+        SELECT COUNT(*) * 100.0 / (SELECT COUNT(*) FROM cheapest_offers) AS percentage
+        FROM cheapest_offers
+        JOIN branch_offers ON cheapest_offers.product_id = branch_offers.product_id
+        AND cheapest_offers.min_price = branch_offers.price
+        """,
+        {"street": "%Leipzig%"},
+    ),
+}
+
+
+class Reports:
+    """Runs the reports over a connection pool.
+
+    Results are cached per report and parameters until the loader bumps the
+    load generation, so repeated requests between two loads cost one
+    single-row SELECT instead of the report query.
+    """
+
+    def __init__(self, workers=4, **connect_args):
+        self.workers = workers
+        self.pool = db.Pool(workers, "reports", **connect_args)
+        self.cache = {}
+        self.lock = Lock()
+
+    def generation(self, cursor):
+        cursor.execute("SELECT generation FROM load_generation WHERE id = 1")
+        return row[0] if (row := cursor.fetchone()) else 0
+
+    def run(self, name, **params):
+        sql, defaults = REPORTS[name]
+        params = {**defaults, **params}
+        key = (name, tuple(sorted(params.items())))
+
+        # a pooled connection goes back to the pool on close
+        conn = self.pool.connect()
+        try:
+            cursor = conn.cursor(buffered=True)
+            generation = self.generation(cursor)
+            with self.lock:
+                cached = self.cache.get(key)
+            if cached and cached[0] == generation:
+                return cached[1]
+
+            cursor.execute(sql, params or None)
+            rows = [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+            cursor.close()
+        finally:
+            conn.close()
+
+        with self.lock:
+            self.cache[key] = (generation, rows)
+        return rows
+
+    def run_all(self, names=None, **params):
+        # each report only gets the parameters it declares
+        names = names or list(REPORTS)
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {
+                name: pool.submit(
+                    self.run,
+                    name,
+                    **{k: v for k, v in params.items() if k in REPORTS[name][1]},
+                )
+                for name in names
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the select.sql reports")
+    parser.add_argument("names", nargs="*", help=f"default: all of {', '.join(REPORTS)}")
+    parser.add_argument("--workers", type=int, default=4)
+    db.add_arguments(parser)
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="report parameter, e.g. n=10 or street=%%Dresden%%",
+    )
+    args = parser.parse_args()
+    if unknown := set(args.names) - set(REPORTS):
+        parser.error(f"unknown reports: {', '.join(sorted(unknown))}")
+
+    params = dict(p.split("=", 1) for p in args.param)
+    results = Reports(args.workers, **db.arguments(args)).run_all(args.names, **params)
+    print(json.dumps(results, indent=2, default=str))
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+
+from backend import MYSQL
+
+
+class KeyCache:
+    """Maps the natural key of a table to its surrogate id.
+
+    Without `max_size` the whole table is loaded on `warm()` and a miss means
+    the row does not exist. With `max_size` only the most recently used keys
+    are kept and a miss falls back to a SELECT.
+
+    Keys are held folded the way the database compares them, so a name that
+    only differs in case or accents finds the row the UNIQUE key matches.
+    """
+
+    def __init__(self, cursor, table, columns, max_size=None, backend=MYSQL):
+        self.cursor = cursor
+        self.table = table
+        self.columns = columns
+        self.max_size = max_size
+        self.fold = backend.fold
+        self.ids = OrderedDict()
+        self.complete = False
+        # `equals` matches NULL to NULL, like the parent of a main category
+        where = " AND ".join(f"{c} {backend.equals} %s" for c in columns)
+        self.lookup = f"SELECT id FROM {table} WHERE {where}"
+        # keys added since the last commit, dropped again on rollback
+        self.pending = []
+
+    def key(self, row):
+        return row[0] if len(self.columns) == 1 else tuple(row)
+
+    def normal(self, key):
+        if len(self.columns) == 1:
+            return self.fold(key) if isinstance(key, str) else key
+        return tuple(self.fold(v) if isinstance(v, str) else v for v in key)
+
+    def warm(self):
+        self.ids.clear()
+        self.pending.clear()
+
+        columns = ", ".join(self.columns)
+        sql = f"SELECT {columns}, id FROM {self.table}"
+        if self.max_size:
+            sql += f" LIMIT {self.max_size}"
+        self.cursor.execute(sql)
+        for *key, id in self.cursor.fetchall():
+            self.ids[self.normal(self.key(key))] = id
+
+        self.complete = not self.max_size or len(self.ids) < self.max_size
+
+    def get(self, key):
+        if (id := self.ids.get(normal := self.normal(key))) is not None:
+            if self.max_size:
+                self.ids.move_to_end(normal)
+            return id
+
+        if self.complete:
+            return None
+
+        val = (key,) if len(self.columns) == 1 else key
+        self.cursor.execute(self.lookup, val)
+        if (id := self.cursor.fetchone()) is None:
+            return None
+
+        self.store(key, id[0])
+        return id[0]
+
+    def get_many(self, keys, chunk_size=1000):
+        # cached keys are answered from memory, the misses of a single column
+        # cache with one IN query per chunk
+        ids, missing = {}, []
+        for key in set(keys):
+            if (id := self.ids.get(self.normal(key))) is not None:
+                ids[key] = id
+            else:
+                missing.append(key)
+
+        if not missing or self.complete:
+            return ids
+
+        if len(self.columns) > 1:
+            for key in missing:
+                if (id := self.get(key)) is not None:
+                    ids[key] = id
+            return ids
+
+        # the rows come back with the stored spelling of the key
+        wanted = {}
+        for key in missing:
+            wanted.setdefault(self.normal(key), []).append(key)
+
+        for i in range(0, len(missing), chunk_size):
+            chunk = missing[i : i + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            self.cursor.execute(
+                f"SELECT {self.columns[0]}, id FROM {self.table} "
+                f"WHERE {self.columns[0]} IN ({placeholders})",
+                chunk,
+            )
+            for key, id in self.cursor.fetchall():
+                self.store(key, id)
+                for original in wanted.get(self.normal(key), ()):
+                    ids[original] = id
+
+        return ids
+
+    def add(self, key, id):
+        self.store(key, id)
+        self.pending.append(self.normal(key))
+
+    def store(self, key, id):
+        self.ids[self.normal(key)] = id
+        if self.max_size and len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+            self.complete = False
+
+    def commit(self):
+        self.pending.clear()
+
+    def rollback(self):
+        for key in self.pending:
+            self.ids.pop(key, None)
+        self.pending.clear()
+
+
+class Resolver:
+    def __init__(self, cursor, max_size=None, backend=MYSQL):
+        self.product = KeyCache(cursor, "product", ("asin",), max_size, backend)
+        self.person = KeyCache(cursor, "person", ("name",), max_size, backend)
+        self.publisher = KeyCache(cursor, "publisher", ("name",), max_size, backend)
+        self.customer = KeyCache(cursor, "customer", ("name",), max_size, backend)
+        self.category = KeyCache(
+            cursor, "category", ("name", "parent_id"), max_size, backend
+        )
+        self.caches = (
+            self.product,
+            self.person,
+            self.publisher,
+            self.customer,
+            self.category,
+        )
+
+    def warm(self):
+        for cache in self.caches:
+            cache.warm()
+
+    def commit(self):
+        for cache in self.caches:
+            cache.commit()
+
+    def rollback(self):
+        for cache in self.caches:
+            cache.rollback()
@@ -0,0 +1,425 @@
+import argparse
+import datetime
+import json
+import os
+import re
+
+import numpy as np
+
+from bulk import TABLES, BulkLoader, StagingFile
+import db
+from reports import REPORTS
+
+# a snapshot is a directory with manifest.json and one directory per table:
+# <column>.npy holds the values, or for strings the offsets into the UTF-8
+# bytes of <column>.utf8.npy; <column>.null.npy marks NULLs where there are any
+DTYPES = {"int": np.int64, "float": np.float64, "date": "datetime64[D]"}
+
+
+# kinds by the type codes of cursor.description in mysql.connector, anything
+# else is a string
+MYSQL_KINDS = {
+    0: "float",  # DECIMAL
+    1: "int",  # TINY
+    2: "int",  # SHORT
+    3: "int",  # LONG
+    4: "float",  # FLOAT
+    5: "float",  # DOUBLE
+    8: "int",  # LONGLONG
+    9: "int",  # INT24
+    10: "date",  # DATE
+    13: "int",  # YEAR
+    14: "date",  # NEWDATE
+    246: "float",  # NEWDECIMAL
+}
+
+
+def declared_kind(declared):
+    # the affinity SQLite gives a declared column type, with DATE kept apart and
+    # BOOLEAN an integer as the TINYINT(1) it is in MySQL
+    declared = declared.upper()
+    if "INT" in declared or "BOOL" in declared:
+        return "int"
+    if "DATE" in declared:
+        return "date"
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB", "DEC", "NUM")):
+        return "float"
+    return "str"
+
+
+def column_kinds(cursor, table, columns, type_codes):
+    # from the schema rather than the values, so an empty table or a column
+    # of NULLs still gets the kind the reports expect; sqlite3 leaves the
+    # type codes of cursor.description empty
+    if None not in type_codes:
+        return [MYSQL_KINDS.get(code, "str") for code in type_codes]
+
+    cursor.execute(f"PRAGMA table_info(`{table}`)")
+    declared = {name.lower(): type for _, name, type, *_ in cursor.fetchall()}
+    return [declared_kind(declared[name.lower()]) for name in columns]
+
+
+def write_column(path, values, kind):
+    nulls = np.array([v is None for v in values], dtype=bool)
+    if nulls.any():
+        np.save(f"{path}.null.npy", nulls)
+
+    if kind == "str":
+        encoded = [(v or "").encode() for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in encoded], out=offsets[1:])
+        np.save(f"{path}.npy", offsets)
+        np.save(f"{path}.utf8.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    else:
+        default = 0 if kind != "date" else datetime.date.min
+        array = np.array(
+            [default if v is None else v for v in values], dtype=DTYPES[kind]
+        )
+        np.save(f"{path}.npy", array)
+
+    return kind
+
+
+def export(cursor, directory, tables=TABLES, chunk_size=10000):
+    """Writes `tables` of the database behind `cursor` as a snapshot."""
+    manifest = {}
+    for table, columns in tables.items():
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+        names = ", ".join(f"`{c}`" for c in columns)
+        cursor.execute(f"SELECT {names} FROM `{table}`")
+        type_codes = [column[1] for column in cursor.description]
+        values = [[] for _ in columns]
+        while rows := cursor.fetchmany(chunk_size):
+            for column, column_values in zip(values, zip(*rows)):
+                column.extend(column_values)
+
+        kinds = column_kinds(cursor, table, columns, type_codes)
+        manifest[table] = {
+            "rows": len(values[0]),
+            "columns": {
+                name: write_column(os.path.join(directory, table, name), column, kind)
+                for name, column, kind in zip(columns, values, kinds)
+            },
+        }
+
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump({"tables": manifest}, f, indent=2)
+
+
+class Snapshot:
+    """A snapshot opened for reading. Numeric and date columns are memory
+    mapped, strings are decoded on first use; columns with NULLs come back
+    as masked arrays."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.tables = json.load(f)["tables"]
+        self.columns = {}
+
+    def load(self, table, name):
+        # an empty file cannot be mapped
+        path = os.path.join(self.directory, table, name)
+        return np.load(path, mmap_mode="r" if self.tables[table]["rows"] else None)
+
+    def column(self, table, name):
+        if (key := (table, name)) in self.columns:
+            return self.columns[key]
+
+        values = self.load(table, f"{name}.npy")
+        if self.tables[table]["columns"][name] == "str":
+            data = self.load(table, f"{name}.utf8.npy").tobytes()
+            offsets = values.tolist()
+            values = np.array(
+                [data[a:b].decode() for a, b in zip(offsets, offsets[1:])],
+                dtype=object,
+            )
+
+        if os.path.exists(os.path.join(self.directory, table, f"{name}.null.npy")):
+            values = np.ma.masked_array(values, self.load(table, f"{name}.null.npy"))
+
+        self.columns[key] = values
+        return values
+
+    def rows(self, table):
+        # python values per row, None for NULL
+        return zip(
+            *(self.column(table, name).tolist() for name in self.tables[table]["columns"])
+        )
+
+    def count(self, table):
+        return self.tables[table]["rows"]
+
+
+class SnapshotLoader(BulkLoader):
+    """Replaces the loaded tables with the contents of a snapshot, through the
+    staging files and LOAD DATA of the bulk backend."""
+
+    def __init__(self, snapshot_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.snapshot = Snapshot(snapshot_dir)
+
+    def stage(self):
+        staging_dir = self.stager.staging_dir
+        os.makedirs(staging_dir, exist_ok=True)
+        for table in TABLES:
+            file = StagingFile(os.path.join(staging_dir, f"{table}.tsv"))
+            for row in self.snapshot.rows(table):
+                file.write(*row)
+            file.close()
+            self.stager.files[table] = file
+
+
+# the reports of reports.py computed on a snapshot, same names and columns
+PRODUCT_TYPES = {"book": "book", "music_cd": "cd", "dvd": "dvd"}
+
+
+def product_ratings(s):
+    # AVG(rating) per product id like product.rating, NaN without reviews
+    product_ids = s.column("review", "product_id")
+    size = int(s.column("product", "id").max(initial=0)) + 1
+    counts = np.bincount(product_ids, minlength=size)
+    sums = np.bincount(product_ids, weights=s.column("review", "rating"), minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def price_ranges(s):
+    # (product ids with an offer, MIN(price), MAX(price)), NaN where all NULL
+    product_ids = s.column("branch_product", "product_id")
+    prices = np.ma.masked_invalid(np.ma.asarray(s.column("branch_product", "price")))
+    ids, inverse = np.unique(product_ids, return_inverse=True)
+    low = np.full(len(ids), np.inf)
+    high = np.full(len(ids), -np.inf)
+    valid = ~np.ma.getmaskarray(prices)
+    np.minimum.at(low, inverse[valid], prices.data[valid])
+    np.maximum.at(high, inverse[valid], prices.data[valid])
+    low[np.isinf(low)] = high[np.isinf(high)] = np.nan
+    return ids, low, high
+
+
+def like(pattern):
+    # a MySQL LIKE pattern as a case-insensitive regex
+    parts = (
+        ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+    )
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def products_per_type(s):
+    return [{"type": t, "count": s.count(table)} for t, table in PRODUCT_TYPES.items()]
+
+
+def top_per_type(s, n=5):
+    ratings = product_ratings(s)
+    rows = []
+    for t, table in PRODUCT_TYPES.items():
+        ids = np.asarray(s.column(table, "id"))
+        values = ratings[ids]
+        # ORDER BY rating DESC puts NULL last
+        order = np.lexsort((-np.nan_to_num(values, nan=-np.inf), np.isnan(values)))
+        for rn, i in enumerate(order[: int(n)], 1):
+            rating = None if np.isnan(values[i]) else float(values[i])
+            rows.append(
+                {"type": t, "product_id": int(ids[i]), "rating": rating, "rn": rn}
+            )
+    return rows
+
+
+def products_without_offer(s):
+    ids = np.setdiff1d(s.column("product", "id"), s.column("branch_product", "product_id"))
+    return [{"product_id": int(id)} for id in ids]
+
+
+def price_spread(s, factor=2):
+    ids, low, high = price_ranges(s)
+    with np.errstate(invalid="ignore"):
+        spread = high > float(factor) * low
+    return [{"product_id": int(id)} for id in ids[spread]]
+
+
+def polarizing_products(s, low=1, high=5):
+    product_ids = s.column("review", "product_id")
+    ratings = s.column("review", "rating")
+    ids = np.intersect1d(
+        product_ids[ratings == int(low)], product_ids[ratings == int(high)]
+    )
+    return [{"product_id": int(id)} for id in ids]
+
+
+def products_without_review(s):
+    ids = np.setdiff1d(s.column("product", "id"), s.column("review", "product_id"))
+    return [{"count": len(ids)}]
+
+
+def frequent_reviewers(s, min_reviews=10):
+    counts = np.bincount(s.column("review", "customer_id"))
+    ids = np.flatnonzero((counts >= int(min_reviews)) & (counts > 0))
+    return [{"customer_id": int(id)} for id in ids]
+
+
+def multimedia_authors(s):
+    person_ids = s.column("person_product", "person_id")
+    product_ids = s.column("person_product", "product_id")
+    authors = person_ids[np.isin(product_ids, s.column("book", "id"))]
+    others = person_ids[
+        np.isin(product_ids, np.concatenate([s.column("cd", "id"), s.column("dvd", "id")]))
+    ]
+    ids = np.intersect1d(authors, others)
+    names = s.column("person", "name")[np.isin(s.column("person", "id"), ids)]
+    return [{"name": name} for name in sorted(set(names.tolist()))]
+
+
+def average_tracks(s):
+    counts = np.bincount(s.column("track", "cd_id"))
+    counts = counts[counts > 0]
+    return [{"average": float(counts.mean()) if len(counts) else None}]
+
+
+def similar_in_other_main_categories(s):
+    # per product_category row: is there a row of another product in another
+    # category below a main category
+    product_ids = np.asarray(s.column("product_category", "product_id"))
+    category_ids = np.asarray(s.column("product_category", "category_id"))
+    parents = s.column("category", "parent_id")
+    mains = np.asarray(s.column("category", "id"))[np.ma.getmaskarray(parents)]
+    below_main = np.isin(
+        category_ids,
+        np.asarray(s.column("category_closure", "descendant_id"))[
+            np.isin(s.column("category_closure", "ancestor_id"), mains)
+        ],
+    )
+
+    # rows below a main category, minus those of the same product or category
+    same_product = np.bincount(product_ids[below_main], minlength=product_ids.max(initial=0) + 1)
+    same_category = np.bincount(category_ids[below_main], minlength=category_ids.max(initial=0) + 1)
+    pairs = {}
+    for pair in zip(product_ids[below_main].tolist(), category_ids[below_main].tolist()):
+        pairs[pair] = pairs.get(pair, 0) + 1
+    others = (
+        below_main.sum()
+        - same_product[product_ids]
+        - same_category[category_ids]
+        + np.array(
+            [pairs.get(p, 0) for p in zip(product_ids.tolist(), category_ids.tolist())],
+            dtype=np.int64,
+        )
+    )
+    return [{"product_id": int(id)} for id in product_ids[others > 0]]
+
+
+def offered_everywhere(s):
+    pairs = np.unique(
+        np.stack(
+            [s.column("branch_product", "product_id"), s.column("branch_product", "branch_id")]
+        ),
+        axis=1,
+    )
+    counts = np.bincount(pairs[0])
+    return [
+        {"product_id": int(id)} for id in np.flatnonzero(counts == s.count("branch"))
+    ]
+
+
+def cheapest_share(s, street="%Leipzig%"):
+    ids, low, _ = price_ranges(s)
+    if not len(ids):
+        return [{"percentage": None}]
+
+    pattern = like(street)
+    streets = s.column("address", "street").tolist()
+    addresses = np.asarray(s.column("address", "id"))[
+        [bool(pattern.fullmatch(street)) for street in streets]
+    ]
+    branches = np.asarray(s.column("branch", "id"))[
+        np.isin(s.column("branch", "address_id"), addresses)
+    ]
+
+    product_ids = np.asarray(s.column("branch_product", "product_id"))
+    prices = np.ma.filled(
+        np.ma.asarray(s.column("branch_product", "price")).astype(float), np.nan
+    )
+    offers = np.isin(s.column("branch_product", "branch_id"), branches)
+    cheapest = low[np.searchsorted(ids, product_ids[offers])]
+    matches = int(np.count_nonzero(prices[offers] == cheapest))
+    return [{"percentage": matches * 100.0 / len(ids)}]
+
+
+ANALYTICS = {
+    "products_per_type": products_per_type,
+    "top_per_type": top_per_type,
+    "products_without_offer": products_without_offer,
+    "price_spread": price_spread,
+    "polarizing_products": polarizing_products,
+    "products_without_review": products_without_review,
+    "frequent_reviewers": frequent_reviewers,
+    "multimedia_authors": multimedia_authors,
+    "average_tracks": average_tracks,
+    "similar_in_other_main_categories": similar_in_other_main_categories,
+    "offered_everywhere": offered_everywhere,
+    "cheapest_share": cheapest_share,
+}
+
+
+def run_all(snapshot, names=None, **params):
+    # each report only gets the parameters it declares in reports.py
+    return {
+        name: ANALYTICS[name](
+            snapshot, **{k: v for k, v in params.items() if k in REPORTS[name][1]}
+        )
+        for name in names or ANALYTICS
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="export the loaded tables as a NumPy snapshot, restore "
+        "a snapshot or run the select.sql reports on one"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write a snapshot")
+    export_parser.add_argument("directory")
+    db.add_arguments(export_parser)
+
+    restore_parser = commands.add_parser(
+        "import", help="replace the loaded tables with a snapshot"
+    )
+    restore_parser.add_argument("directory")
+    restore_parser.add_argument("--staging-dir")
+    restore_parser.add_argument("--workers", type=int)
+    db.add_arguments(restore_parser)
+
+    report_parser = commands.add_parser(
+        "report", help="run reports on a snapshot, no database needed"
+    )
+    report_parser.add_argument("directory")
+    report_parser.add_argument("names", nargs="*", help=f"default: all of {', '.join(ANALYTICS)}")
+    report_parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="report parameter, e.g. n=10 or street=%%Dresden%%",
+    )
+    args = parser.parse_args()
+
+    if args.command == "export":
+        conn = db.connect(**db.arguments(args))
+        cursor = conn.cursor()
+        export(cursor, args.directory)
+        cursor.close()
+        conn.close()
+    elif args.command == "import":
+        SnapshotLoader(
+            args.directory,
+            staging_dir=args.staging_dir,
+            workers=args.workers,
+            **db.arguments(args),
+        ).load()
+    else:
+        if unknown := set(args.names) - set(ANALYTICS):
+            parser.error(f"unknown reports: {', '.join(sorted(unknown))}")
+        params = dict(p.split("=", 1) for p in args.param)
+        results = run_all(Snapshot(args.directory), args.names, **params)
+        print(json.dumps(results, indent=2, default=str))
@@ -0,0 +1,57 @@
+from backend import MYSQL
+
+# summary table -> (key column, summary columns, aggregate query over the
+# source table, grouped by the key; {} takes the WHERE clause)
+SUMMARIES = {
+    "product_price_summary": (
+        "product_id",
+        ("min_price", "max_price", "branch_count"),
+        """
+        SELECT `product_id`, MIN(`price`), MAX(`price`), COUNT(DISTINCT `branch_id`)
+        FROM `branch_product` {} GROUP BY `product_id`
+        """,
+    ),
+    "cd_track_summary": (
+        "cd_id",
+        ("track_count",),
+        "SELECT `cd_id`, COUNT(*) FROM `track` {} GROUP BY `cd_id`",
+    ),
+    "customer_review_summary": (
+        "customer_id",
+        ("review_count",),
+        "SELECT `customer_id`, COUNT(*) FROM `review` {} GROUP BY `customer_id`",
+    ),
+}
+
+
+class Summaries:
+    """Keeps the summary tables in step with their source tables.
+
+    The loader touches the key of every row it writes; `refresh` then
+    recomputes only those keys, or every table from scratch.
+    """
+
+    def __init__(self, cursor, batch_size=1000, backend=MYSQL):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.backend = backend
+        self.touched = {table: set() for table in SUMMARIES}
+
+    def touch(self, table, key):
+        self.touched[table].add(key)
+
+    def refresh(self, full=False):
+        for table, (key, columns, query) in SUMMARIES.items():
+            sql = self.backend.insert(table, (key, *columns), columns, query)
+
+            if full:
+                self.cursor.execute(f"DELETE FROM `{table}`")
+                self.cursor.execute(sql.format(""))
+            else:
+                keys = list(self.touched[table])
+                for i in range(0, len(keys), self.batch_size):
+                    chunk = keys[i : i + self.batch_size]
+                    where = f"WHERE `{key}` IN ({', '.join(['%s'] * len(chunk))})"
+                    self.cursor.execute(sql.format(where), chunk)
+
+            self.touched[table].clear()
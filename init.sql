@@ -84,6 +84,16 @@ CREATE TABLE `category` (
     UNIQUE KEY (`name`, `parent_id`),
     FOREIGN KEY (`parent_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 );
+-- every ancestor of a category, including itself at depth 0
+CREATE TABLE `category_closure` (
+    `ancestor_id` INT NOT NULL,
+    `descendant_id` INT NOT NULL,
+    `depth` INT NOT NULL,
+    PRIMARY KEY (`ancestor_id`, `descendant_id`),
+    KEY (`descendant_id`, `depth`),
+    FOREIGN KEY (`ancestor_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`descendant_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
 CREATE TABLE `product_category` (
     `product_id` INT NOT NULL,
     `category_id` INT NOT NULL,
@@ -150,8 +160,51 @@ CREATE TABLE `review` (
     FOREIGN KEY (`customer_id`) REFERENCES `customer` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
     FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 );
+-- SUMMARIES (maintained by the loader, see app/summary.py)
+CREATE TABLE `product_price_summary` (
+    `product_id` INT PRIMARY KEY,
+    `min_price` DECIMAL(8, 2),
+    `max_price` DECIMAL(8, 2),
+    `branch_count` INT NOT NULL,
+    KEY (`branch_count`),
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `cd_track_summary` (
+    `cd_id` INT PRIMARY KEY,
+    `track_count` INT NOT NULL,
+    FOREIGN KEY (`cd_id`) REFERENCES `cd` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `customer_review_summary` (
+    `customer_id` INT PRIMARY KEY,
+    `review_count` INT NOT NULL,
+    KEY (`review_count`),
+    FOREIGN KEY (`customer_id`) REFERENCES `customer` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- INDEXES (see app/indexes.py)
+CREATE INDEX `customer_name` ON `customer` (`name`);
+CREATE INDEX `review_rating_product` ON `review` (`rating`, `product_id`);
+-- LOADER STATE
+CREATE TABLE `load_checkpoint` (
+    `source` VARCHAR(255) PRIMARY KEY,
+    `file_hash` CHAR(64) NOT NULL,
+    `position` INT NOT NULL DEFAULT 0,
+    `completed` BOOLEAN NOT NULL DEFAULT FALSE
+);
+-- bumped by every load, cached reports are recomputed once it changes
+CREATE TABLE `load_generation` (
+    `id` INT PRIMARY KEY,
+    `generation` INT NOT NULL
+);
+CREATE TABLE `load_item` (
+    `source` VARCHAR(255) NOT NULL,
+    `item_key` VARCHAR(255) NOT NULL,
+    `digest` CHAR(32) NOT NULL,
+    PRIMARY KEY (`source`, `item_key`)
+);
 -- TRIGGERS
-CREATE TRIGGER `product_rating` BEFORE
+-- a loader that sets @skip_rating_trigger = 1 computes the ratings itself
+-- in one pass after the reviews are written
+CREATE TRIGGER `product_rating` AFTER
 INSERT ON `review` FOR EACH ROW
 UPDATE `product`
 SET `rating` = (
@@ -159,10 +212,23 @@ SET `rating` = (
         FROM `review`
         WHERE `product_id` = NEW.`product_id`
     )
-WHERE `id` = NEW.`product_id`;
+WHERE `id` = NEW.`product_id`
+    AND COALESCE(@skip_rating_trigger, 0) = 0;
+CREATE TRIGGER `product_rating_update` AFTER
+UPDATE ON `review` FOR EACH ROW
+UPDATE `product`
+SET `rating` = (
+        SELECT AVG(`rating`)
+        FROM `review`
+        WHERE `product_id` = NEW.`product_id`
+    )
+WHERE `id` = NEW.`product_id`
+    AND COALESCE(@skip_rating_trigger, 0) = 0;
+-- a loader that sets @skip_role_trigger = 1 writes the role of the product
+-- group itself
 DELIMITER $$ --
 CREATE TRIGGER `person_product_role` BEFORE
-INSERT ON `person_product` FOR EACH ROW BEGIN IF EXISTS(
+INSERT ON `person_product` FOR EACH ROW BEGIN IF COALESCE(@skip_role_trigger, 0) = 0 THEN IF EXISTS(
         SELECT 1
         FROM `book`
         WHERE `id` = NEW.`product_id`
@@ -175,6 +241,7 @@ ELSEIF EXISTS(
 ) THEN
 SET NEW.`role` = 'ARTIST';
 END IF;
+END IF;
 END $$ --
 DELIMITER ;
 CREATE TRIGGER `order_price` BEFORE
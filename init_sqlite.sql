@@ -0,0 +1,262 @@
+-- the schema of init.sql for the SQLite backend (app/backend.py): INTEGER
+-- PRIMARY KEY for AUTO_INCREMENT, CHECK constraints for ENUMs and AFTER
+-- triggers that update the inserted row instead of assigning to NEW
+CREATE TABLE `product` (
+    `id` INTEGER PRIMARY KEY,
+    `asin` VARCHAR(10) UNIQUE NOT NULL,
+    `name` VARCHAR(255) NOT NULL,
+    `image` TEXT,
+    `rank` INT,
+    `rating` REAL CHECK (
+        `rating` IS NULL
+        OR (
+            `rating` >= 1
+            AND `rating` <= 5
+        )
+    )
+);
+CREATE TABLE `recommendation` (
+    `product_id` INT NOT NULL,
+    `recommended_product_id` INT NOT NULL,
+    PRIMARY KEY (`product_id`, `recommended_product_id`),
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`recommended_product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- BOOKS TABLE
+CREATE TABLE `publisher` (
+    `id` INTEGER PRIMARY KEY,
+    `name` VARCHAR(255) UNIQUE NOT NULL
+);
+CREATE TABLE `book`(
+    `id` INT PRIMARY KEY,
+    `ISBN` VARCHAR(13) NOT NULL,
+    `n_pages` INT NOT NULL,
+    `date_published` DATE NOT NULL,
+    `publisher_id` INT NOT NULL,
+    FOREIGN KEY (`id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`publisher_id`) REFERENCES `publisher` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- DVD TABLE
+CREATE TABLE `dvd` (
+    `id` INT PRIMARY KEY,
+    `format` VARCHAR(255) NOT NULL,
+    `duration` INT NOT NULL,
+    `region_code` VARCHAR(255) NOT NULL,
+    FOREIGN KEY (`id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- MUSIC TABLE
+CREATE TABLE `cd` (
+    `id` INT PRIMARY KEY,
+    `label` VARCHAR(255) NOT NULL,
+    `date_published` DATE NOT NULL,
+    FOREIGN KEY (`id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `track` (
+    `id` INTEGER PRIMARY KEY,
+    `cd_id` INT NOT NULL,
+    `title` VARCHAR(255) NOT NULL,
+    FOREIGN KEY (`cd_id`) REFERENCES `cd` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `track_cd` ON `track` (`cd_id`);
+-- INVOLVED PERSONS
+CREATE TABLE `person` (
+    `id` INTEGER PRIMARY KEY,
+    `name` VARCHAR(255) UNIQUE NOT NULL
+);
+CREATE TABLE `person_product` (
+    `person_id` INT NOT NULL,
+    `product_id` INT NOT NULL,
+    `role` VARCHAR(8) NOT NULL CHECK (
+        `role` IN ('AUTHOR', 'ARTIST', 'ACTOR', 'CREATOR', 'DIRECTOR')
+    ),
+    PRIMARY KEY (`person_id`, `product_id`, `role`),
+    FOREIGN KEY (`person_id`) REFERENCES `person` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `person_product_product` ON `person_product` (`product_id`);
+-- CATEGORIES
+CREATE TABLE `category` (
+    `id` INTEGER PRIMARY KEY,
+    `name` VARCHAR(255) NOT NULL,
+    `parent_id` INT,
+    UNIQUE (`name`, `parent_id`),
+    FOREIGN KEY (`parent_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- every ancestor of a category, including itself at depth 0
+CREATE TABLE `category_closure` (
+    `ancestor_id` INT NOT NULL,
+    `descendant_id` INT NOT NULL,
+    `depth` INT NOT NULL,
+    PRIMARY KEY (`ancestor_id`, `descendant_id`),
+    FOREIGN KEY (`ancestor_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`descendant_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `category_closure_descendant` ON `category_closure` (`descendant_id`, `depth`);
+CREATE TABLE `product_category` (
+    `product_id` INT NOT NULL,
+    `category_id` INT NOT NULL,
+    PRIMARY KEY (`product_id`, `category_id`),
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`category_id`) REFERENCES `category` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- BRANCHES
+CREATE TABLE `address` (
+    `id` INTEGER PRIMARY KEY,
+    `street` VARCHAR(255) NOT NULL,
+    `zip` VARCHAR(255) NOT NULL
+);
+CREATE TABLE `branch` (
+    `id` INTEGER PRIMARY KEY,
+    `name` VARCHAR(255) UNIQUE NOT NULL,
+    `address_id` INT NOT NULL,
+    FOREIGN KEY (`address_id`) REFERENCES `address` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `branch_product` (
+    `id` INTEGER PRIMARY KEY,
+    `branch_id` INT NOT NULL,
+    `product_id` INT NOT NULL,
+    `price` DECIMAL(8, 2),
+    `stock` BOOLEAN NOT NULL,
+    `state` VARCHAR(6) NOT NULL CHECK (`state` IN ('NEW', 'AS_NEW', 'USED')),
+    UNIQUE (`branch_id`, `product_id`, `state`),
+    FOREIGN KEY (`branch_id`) REFERENCES `branch` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- CUSTOMERS
+CREATE TABLE `customer` (
+    `id` INTEGER PRIMARY KEY,
+    `name` VARCHAR(255) NOT NULL,
+    `iban` VARCHAR(50),
+    `address_id` INT,
+    FOREIGN KEY (`address_id`) REFERENCES `address` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `order` (
+    `id` INTEGER PRIMARY KEY,
+    `customer_id` INT,
+    `branch_product_id` INT,
+    `date` DATE NOT NULL,
+    -- set by the order_price trigger after the row is inserted
+    `price` DECIMAL(8, 2),
+    FOREIGN KEY (`customer_id`) REFERENCES `customer` (`id`) ON DELETE SET NULL ON UPDATE CASCADE,
+    FOREIGN KEY (`branch_product_id`) REFERENCES `branch_product` (`id`) ON DELETE SET NULL ON UPDATE CASCADE
+);
+CREATE TABLE `review` (
+    `customer_id` INT NOT NULL,
+    `product_id` INT NOT NULL,
+    `rating` INT NOT NULL CHECK (
+        `rating` >= 1
+        AND `rating` <= 5
+    ),
+    `summary` VARCHAR(255) NOT NULL,
+    `content` TEXT NOT NULL,
+    PRIMARY KEY (`product_id`, `customer_id`),
+    FOREIGN KEY (`customer_id`) REFERENCES `customer` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `review_customer` ON `review` (`customer_id`);
+-- SUMMARIES (maintained by the loader, see app/summary.py)
+CREATE TABLE `product_price_summary` (
+    `product_id` INT PRIMARY KEY,
+    `min_price` DECIMAL(8, 2),
+    `max_price` DECIMAL(8, 2),
+    `branch_count` INT NOT NULL,
+    FOREIGN KEY (`product_id`) REFERENCES `product` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `product_price_summary_branch_count` ON `product_price_summary` (`branch_count`);
+CREATE TABLE `cd_track_summary` (
+    `cd_id` INT PRIMARY KEY,
+    `track_count` INT NOT NULL,
+    FOREIGN KEY (`cd_id`) REFERENCES `cd` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE TABLE `customer_review_summary` (
+    `customer_id` INT PRIMARY KEY,
+    `review_count` INT NOT NULL,
+    FOREIGN KEY (`customer_id`) REFERENCES `customer` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+);
+CREATE INDEX `customer_review_summary_review_count` ON `customer_review_summary` (`review_count`);
+-- INDEXES (see app/indexes.py)
+CREATE INDEX `customer_name` ON `customer` (`name`);
+CREATE INDEX `review_rating_product` ON `review` (`rating`, `product_id`);
+-- LOADER STATE
+CREATE TABLE `load_checkpoint` (
+    `source` VARCHAR(255) PRIMARY KEY,
+    `file_hash` CHAR(64) NOT NULL,
+    `position` INT NOT NULL DEFAULT 0,
+    `completed` BOOLEAN NOT NULL DEFAULT FALSE
+);
+-- bumped by every load, cached reports are recomputed once it changes
+CREATE TABLE `load_generation` (
+    `id` INT PRIMARY KEY,
+    `generation` INT NOT NULL
+);
+CREATE TABLE `load_item` (
+    `source` VARCHAR(255) NOT NULL,
+    `item_key` VARCHAR(255) NOT NULL,
+    `digest` CHAR(32) NOT NULL,
+    PRIMARY KEY (`source`, `item_key`)
+);
+-- TRIGGERS
+-- variable(name) returns the session variable @name of the loader connection
+CREATE TRIGGER `product_rating` AFTER
+INSERT ON `review` FOR EACH ROW
+    WHEN COALESCE(variable('skip_rating_trigger'), 0) = 0 BEGIN
+UPDATE `product`
+SET `rating` = (
+        SELECT AVG(`rating`)
+        FROM `review`
+        WHERE `product_id` = NEW.`product_id`
+    )
+WHERE `id` = NEW.`product_id`;
+END;
+CREATE TRIGGER `product_rating_update` AFTER
+UPDATE ON `review` FOR EACH ROW
+    WHEN COALESCE(variable('skip_rating_trigger'), 0) = 0 BEGIN
+UPDATE `product`
+SET `rating` = (
+        SELECT AVG(`rating`)
+        FROM `review`
+        WHERE `product_id` = NEW.`product_id`
+    )
+WHERE `id` = NEW.`product_id`;
+END;
+-- the inserted row gets the role of its product type; when a row with that
+-- role exists already, the new one is dropped like a duplicate in MySQL
+CREATE TRIGGER `person_product_role` AFTER
+INSERT ON `person_product` FOR EACH ROW
+    WHEN COALESCE(variable('skip_role_trigger'), 0) = 0 BEGIN
+DELETE FROM `person_product`
+WHERE `person_id` = NEW.`person_id`
+    AND `product_id` = NEW.`product_id`
+    AND `role` = NEW.`role`
+    AND EXISTS(
+        SELECT 1
+        FROM `person_product`
+        WHERE `person_id` = NEW.`person_id`
+            AND `product_id` = NEW.`product_id`
+            AND `role` = CASE
+                WHEN EXISTS(SELECT 1 FROM `book` WHERE `id` = NEW.`product_id`) THEN 'AUTHOR'
+                WHEN EXISTS(SELECT 1 FROM `cd` WHERE `id` = NEW.`product_id`) THEN 'ARTIST'
+                ELSE NEW.`role`
+            END
+            AND `role` <> NEW.`role`
+    );
+UPDATE `person_product`
+SET `role` = CASE
+        WHEN EXISTS(SELECT 1 FROM `book` WHERE `id` = NEW.`product_id`) THEN 'AUTHOR'
+        WHEN EXISTS(SELECT 1 FROM `cd` WHERE `id` = NEW.`product_id`) THEN 'ARTIST'
+        ELSE `role`
+    END
+WHERE `person_id` = NEW.`person_id`
+    AND `product_id` = NEW.`product_id`
+    AND `role` = NEW.`role`;
+END;
+CREATE TRIGGER `order_price` AFTER
+INSERT ON `order` FOR EACH ROW BEGIN
+UPDATE `order`
+SET `price` = (
+        SELECT `price`
+        FROM `branch_product`
+        WHERE `id` = NEW.`branch_product_id`
+    )
+WHERE `id` = NEW.`id`;
+END;
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from backend import SQLiteBackend
+from bulk import TABLES, Stager
+from generate import Generator
+from loader import DataLoader
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data")
+    Generator(60, invalid=0.1, seed=1).write(path)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def error_counts(monkeypatch):
+    # the counts are kept on the class; load() starts a new dict per load
+    monkeypatch.setattr(DataLoader, "error_counts", {})
+
+
+def load(data, path, **kwargs):
+    DataLoader.error_counts = {}
+    DataLoader(data_path=data, backend=SQLiteBackend(str(path)), **kwargs).load()
+    return DataLoader.error_counts
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    rows = {table: sorted(conn.execute(f"SELECT * FROM `{table}`")) for table in TABLES}
+    conn.close()
+    return rows
+
+
+def test_load_matches_dry_run(data, tmp_path):
+    errors = load(data, tmp_path / "load.db")
+    stager = Stager(data_path=data, dry_run=True)
+    stager.load()
+    report = stager.report()
+
+    counts = {table: len(rows) for table, rows in dump(tmp_path / "load.db").items()}
+    assert counts == report["rows"]
+    assert all(counts[table] for table in ("product", "book", "cd", "dvd", "review"))
+    assert errors == {int(code): e["count"] for code, e in report["errors"].items()}
+    # every kind of defect the generator writes into reviews is reported
+    assert {1, 2, 3, 4, 5, 6} <= set(errors)
+
+
+def test_deferred_ratings(data, tmp_path):
+    load(data, tmp_path / "load.db", ratings="deferred")
+
+    conn = sqlite3.connect(tmp_path / "load.db")
+    ratings = dict(conn.execute("SELECT `id`, `rating` FROM `product`"))
+    averages = dict(
+        conn.execute("SELECT `product_id`, AVG(`rating`) FROM `review` GROUP BY `product_id`")
+    )
+    conn.close()
+
+    assert averages
+    assert ratings == {id: averages.get(id) for id in ratings}
+
+
+def test_incremental_pass_is_noop(data, tmp_path):
+    load(data, tmp_path / "load.db", checkpoint_mode="incremental")
+    rows = dump(tmp_path / "load.db")
+
+    assert load(data, tmp_path / "load.db", checkpoint_mode="incremental") == {}
+    assert dump(tmp_path / "load.db") == rows
+
+    conn = sqlite3.connect(tmp_path / "load.db")
+    assert conn.execute("SELECT `generation` FROM `load_generation`").fetchall() == [(2,)]
+    conn.close()
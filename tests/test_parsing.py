@@ -0,0 +1,255 @@
+from datetime import date
+from itertools import product
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from parsing import (
+    ValidationError,
+    parse_item,
+    parse_records,
+    parse_review,
+    parse_review_chunk,
+    parse_shop,
+    similar_asins,
+)
+from records import BookSpec, CdSpec, DvdSpec, Offer, PersonRole, Product
+
+# one item per product group in the form generate.py writes, with persons as
+# name attributes
+ITEMS = {
+    "Book": """
+        <item pgroup="Book" asin="B1" salesrank="93543" picture="b.jpg">
+            <title>House City Music</title>
+            <price state="new" mult="0.01" currency="EUR">1628</price>
+            <similars><sim_product><asin>M1</asin></sim_product></similars>
+            <authors><author name="Person 26" /><author name="" /><author name="Person 39" /></authors>
+            <artists /><actors /><creators /><directors /><labels />
+            <publishers><publisher name="" /><publisher name="Of River" /></publishers>
+            <tracks />
+            <bookspec>
+                <isbn val="4503729359" /><pages>577</pages><publication date="1991-05-23" />
+            </bookspec>
+            <musicspec /><dvdspec />
+        </item>
+    """,
+    "DVD": """
+        <item pgroup="DVD" asin="D1" salesrank="81002">
+            <title>Paper Story Of</title>
+            <price state="used" mult="0.01" currency="EUR" />
+            <similars><sim_product asin="B1" /><sim_product asin="" /></similars>
+            <authors /><artists />
+            <actors><actor name="Person 41" /><actor name="Person 25" /></actors>
+            <creators><creator name="Person 42" /></creators>
+            <directors><director name="Person 41" /></directors>
+            <labels /><publishers /><tracks /><bookspec /><musicspec />
+            <dvdspec><format>PAL</format><regioncode>2</regioncode><runningtime>185</runningtime></dvdspec>
+        </item>
+    """,
+    "Music": """
+        <item pgroup="Music" asin="M1" salesrank="">
+            <title>Garden Stone Dream</title>
+            <price state="New" mult="0.01" currency="EUR">8242</price>
+            <similars />
+            <authors /><artists><artist name="Person 46" /></artists>
+            <actors /><creators /><directors />
+            <labels><label name="Secret" /><label name="House Secret" /></labels>
+            <publishers />
+            <tracks><title>The House</title><title>Story Last</title></tracks>
+            <bookspec /><musicspec><releasedate>1997-12-05</releasedate></musicspec><dvdspec />
+        </item>
+    """,
+}
+
+# a trimmed item of app/data/dresden.xml: the similar products are <item>
+# elements with the ASIN in an attribute and the title as text
+DRESDEN_ITEM = """
+    <item pgroup="DVD" asin="B00066KWNS" salesrank="3789">
+        <title>Stray Cats - Rumble in Brixton</title>
+        <price state="new" mult="0.01" currency=""></price>
+        <actors><actor>Stray Cats</actor></actors><artists></artists><authors></authors>
+        <creators><creator>Pierre Lamoureux</creator></creators>
+        <directors><director>Pierre Lamoureux</director></directors>
+        <labels></labels><publishers></publishers>
+        <similars>
+            <item asin="B000B5IOSE">The Brian Setzer Orchestra - Christmas Extravaganza</item>
+            <item asin="B0002IQJS6">Stray Cats - Live</item>
+        </similars>
+        <tracks></tracks><bookspec></bookspec>
+        <dvdspec><format>AC-3,PAL</format><regioncode>0</regioncode><runningtime>129</runningtime></dvdspec>
+        <musicspec></musicspec>
+    </item>
+"""
+
+
+def item(pgroup, change=None):
+    root = ET.fromstring(ITEMS[pgroup])
+    if change:
+        change(root)
+    return root
+
+
+def clear(path, attribute=None):
+    # empties the text or an attribute of the element at `path`
+    def change(root):
+        elem = root.find(path) if path else root
+        if attribute:
+            elem.set(attribute, "")
+        else:
+            elem.text = None
+
+    return change
+
+
+def test_book():
+    assert parse_item(item("Book")) == Product(
+        "B1",
+        "Book",
+        "House City Music",
+        "b.jpg",
+        93543,
+        BookSpec("4503729359", 577, date(1991, 5, 23), "Of River"),
+        [PersonRole("Person 26", "AUTHOR"), PersonRole("Person 39", "AUTHOR")],
+        Offer(1628.0, "NEW", True),
+    )
+
+
+def test_dvd():
+    assert parse_item(item("DVD")) == Product(
+        "D1",
+        "DVD",
+        "Paper Story Of",
+        None,
+        81002,
+        DvdSpec("PAL", 185, "2"),
+        [
+            PersonRole("Person 41", "ACTOR"),
+            PersonRole("Person 25", "ACTOR"),
+            PersonRole("Person 42", "CREATOR"),
+            PersonRole("Person 41", "DIRECTOR"),
+        ],
+        Offer(None, "USED", False),
+    )
+
+
+def test_music():
+    # the longest label wins
+    assert parse_item(item("Music")) == Product(
+        "M1",
+        "Music",
+        "Garden Stone Dream",
+        None,
+        None,
+        CdSpec("House Secret", date(1997, 12, 5), ["The House", "Story Last"]),
+        [PersonRole("Person 46", "ARTIST")],
+        Offer(8242.0, "NEW", True),
+    )
+
+
+def no_labels(root):
+    for label in root.find("labels"):
+        label.set("name", "")
+
+
+def no_publishers(root):
+    for publisher in root.find("publishers"):
+        publisher.set("name", "")
+
+
+@pytest.mark.parametrize(
+    "pgroup, change, code, attribute",
+    [
+        ("Book", clear(None, "asin"), 14, "asin"),
+        ("Book", lambda root: root.set("pgroup", "Game"), 15, "pgroup"),
+        ("DVD", clear("title"), 16, "name"),
+        ("Music", no_labels, 18, "label"),
+        ("Music", clear("musicspec/releasedate"), 19, "date_published"),
+        ("DVD", clear("dvdspec/format"), 24, "format"),
+        ("DVD", clear("dvdspec/runningtime"), 25, "duration"),
+        ("DVD", clear("dvdspec/regioncode"), 26, "region_code"),
+        ("Book", clear("bookspec/isbn", "val"), 30, "isbn"),
+        ("Book", clear("bookspec/pages"), 31, "n_pages"),
+        ("Book", clear("bookspec/publication", "date"), 32, "date_published"),
+        ("Book", no_publishers, 33, "publisher"),
+        ("Music", lambda root: root.find("price").set("state", "mint"), 38, "state"),
+    ],
+)
+def test_item_errors(pgroup, change, code, attribute):
+    with pytest.raises(ValidationError) as e:
+        parse_item(item(pgroup, change))
+
+    assert e.value.args[0] == code
+    assert e.value.args[2] == attribute
+
+
+def test_records_keep_similars_of_invalid_items():
+    items = [item("Book"), item("DVD", clear("title")), item("Music")]
+    records = list(parse_records(items))
+
+    assert [(asin, similars) for asin, similars, _, _ in records] == [
+        ("B1", ["M1"]),
+        ("D1", ["B1", ""]),
+        ("M1", []),
+    ]
+    assert [item is None for _, _, item, _ in records] == [False, True, False]
+    assert records[1][3] == (16, "D1", "name", "Missing name")
+
+
+def test_dresden_similars():
+    root = ET.fromstring(DRESDEN_ITEM)
+    assert similar_asins(root) == ["B000B5IOSE", "B0002IQJS6"]
+
+    [(asin, similars, product, error)] = parse_records([root])
+    assert (asin, similars, error) == ("B00066KWNS", ["B000B5IOSE", "B0002IQJS6"], None)
+    assert product.spec == DvdSpec("AC-3,PAL", 129, "0")
+
+
+def test_shop():
+    root = ET.fromstring('<shop name="Dresden" street="Johann-Meyer-Straße" zip="01097" />')
+    assert parse_shop(root) == ("Dresden", "Johann-Meyer-Straße", "01097")
+
+    root.set("zip", "")
+    with pytest.raises(ValidationError) as e:
+        parse_shop(root)
+    assert e.value.args[0] == 40
+
+
+HEADER = ["product", "rating", "helpful", "reviewdate", "user", "summary", "content"]
+# every combination of a valid and an invalid value per checked column
+ROWS = [
+    [asin, rating, "5", "1972-09-07", user, summary, content]
+    for asin, rating, user, summary, content in product(
+        ["G000000209", ""],
+        ["2", "", "0", "6", "x", "5"],
+        ["customer126", ""],
+        ["Blue Secret River", ""],
+        ["River Dream", ""],
+    )
+]
+
+
+def test_review():
+    assert parse_review(dict(zip(HEADER, ROWS[0]))) == {
+        "asin": "G000000209",
+        "rating": 2,
+        "customer": "customer126",
+        "summary": "Blue Secret River",
+        "content": "River Dream",
+    }
+
+
+def test_review_chunk_matches_review():
+    reviews, errors = parse_review_chunk(HEADER, ROWS)
+    results = {**dict(reviews), **dict(errors)}
+    assert sorted(results) == list(range(len(ROWS)))
+
+    for index, row in enumerate(ROWS):
+        try:
+            expected = parse_review(dict(zip(HEADER, row)))
+        except ValidationError as e:
+            expected = e.args
+        assert results[index] == expected, row
+
+
+def test_review_chunk_empty():
+    assert parse_review_chunk(HEADER, []) == ([], [])
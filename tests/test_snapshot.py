@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from backend import SQLiteBackend
+from bulk import TABLES
+from snapshot import ANALYTICS, Snapshot, export, run_all
+
+
+@pytest.fixture
+def conn():
+    conn = SQLiteBackend().connect()
+    yield conn
+    conn.close()
+
+
+def snapshot(conn, directory):
+    cursor = conn.cursor()
+    export(cursor, directory)
+    cursor.close()
+    return Snapshot(directory)
+
+
+def test_empty_tables_keep_their_kinds(conn, tmp_path):
+    s = snapshot(conn, tmp_path)
+    with open(tmp_path / "manifest.json") as f:
+        tables = json.load(f)["tables"]
+
+    assert set(tables) == set(TABLES)
+    assert all(t["rows"] == 0 for t in tables.values())
+    assert tables["review"]["columns"] == {
+        "customer_id": "int",
+        "product_id": "int",
+        "rating": "int",
+        "summary": "str",
+        "content": "str",
+    }
+    assert tables["book"]["columns"]["date_published"] == "date"
+    assert tables["branch_product"]["columns"]["price"] == "float"
+    assert tables["branch_product"]["columns"]["stock"] == "int"
+    assert s.column("product", "id").dtype.kind == "i"
+
+
+def test_reports_on_empty_snapshot(conn, tmp_path):
+    results = run_all(snapshot(conn, tmp_path))
+
+    assert set(results) == set(ANALYTICS)
+    assert results["products_per_type"] == [
+        {"type": t, "count": 0} for t in ("book", "music_cd", "dvd")
+    ]
+    assert results["top_per_type"] == []
+    assert results["frequent_reviewers"] == []
+    assert results["average_tracks"] == [{"average": None}]
+    assert results["cheapest_share"] == [{"percentage": None}]
+
+
+def test_column_of_nulls_keeps_its_kind(conn, tmp_path):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO `address` VALUES (1, 'Hauptstr. 1, Leipzig', '04109')")
+    cursor.execute("INSERT INTO `branch` VALUES (1, 'Leipzig', 1)")
+    cursor.execute("INSERT INTO `product` (`id`, `asin`, `name`) VALUES (1, 'A1', 'x')")
+    cursor.execute(
+        "INSERT INTO `branch_product` (`branch_id`, `product_id`, `price`, `stock`, `state`)"
+        " VALUES (1, 1, NULL, 0, 'NEW')"
+    )
+    conn.commit()
+    cursor.close()
+
+    s = snapshot(conn, tmp_path)
+
+    assert s.tables["branch_product"]["columns"]["price"] == "float"
+    assert s.column("branch_product", "price").mask.all()
+    assert run_all(s, ["price_spread", "cheapest_share"]) == {
+        "price_spread": [],
+        "cheapest_share": [{"percentage": 0.0}],
+    }